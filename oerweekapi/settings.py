@@ -122,6 +122,8 @@ TEMPLATES = [
                 "django.contrib.messages.context_processors.messages",
                 "web.timezone_utils.inject_timezones",
                 "web.utils.inject_template_variables",
+                # overrides Django's built-in `csrf` context processor for cached pages
+                "web.page_cache_utils.csrf",
             ],
         },
     },
@@ -132,6 +134,9 @@ WSGI_APPLICATION = "oerweekapi.wsgi.application"
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
 EMAIL_NOTIF_FROM = "info@openeducationweek.org"
 EMAIL_NOTIF_CC = ["openeducationweek@oeglobal.org"]
+# max. number of queued emails sent per minute (see web.email_utils.send_email_task), should match limits
+# of the SMTP server/provider
+EMAIL_QUEUE_RATE_LIMIT = 60
 
 # Internationalization
 # https://docs.djangoproject.com/en/1.8/topics/i18n/
@@ -164,6 +169,10 @@ MEDIA_ROOT = os.path.join(BASE_DIR, "media")
 # TODO: later we need to resolve the concundrum with oeweek2022 being fork of oerweekapi, while both are run at PROD (oeweek2022 as oeweek.oeglobal.org and oerweekapi api.openeducationweek.org, with oeweek.oeglobal.org still using api.openeducationweek.org) for example via MEDIA_URL (not sure how else)
 MEDIA_URL = "/media/"
 
+# prebuilt index of geonamescache cities (see web.geo_utils and `build_geo_index` command), built on the fly
+# if missing
+GEO_INDEX_FILE = os.path.join(BASE_DIR, "geo_index.pickle")
+
 RESOURCE_IMAGE_MAX_SIZE = 4 * 1024 * 1024  # for non-admin users
 RESOURCE_IMAGE_MAX_WIDTH = 4096
 RESOURCE_IMAGE_MAX_HEIGHT = 2048
@@ -287,6 +296,38 @@ MAGICLINK_ANTISPAM_FORMS = True
 COMING_UP_NEXT_COUNT = 3
 MAX_FAVORITES = 128
 
+CACHES = {
+    # stuff derived from resources (schedule index, facets, ...), keyed by generation of resources, so it can be
+    # per process (stale entries are just not used anymore)
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # generation of resources (see web/cache_utils.py) and similar state, which has to be shared by all
+    # the processes (web workers, django-q cluster, ...) and never culled, otherwise changes made by one process
+    # are not seen by the others; can be overridden in localsettings.py, but only by a cache shared among
+    # processes (and machines, if there are more of them), e.g. "django.core.cache.backends.memcached.PyMemcacheCache"
+    "shared": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.path.join(BASE_DIR, "shared_cache"),
+        "TIMEOUT": None,
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+    # rendered event/resource cards (see web/fragment_utils.py), can be overridden in localsettings.py
+    # to be shared among processes, e.g. with "django.core.cache.backends.filebased.FileBasedCache"
+    # or "django.core.cache.backends.memcached.PyMemcacheCache"
+    "fragments": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "fragments",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    # whole pages for anonymous visitors (see web/page_cache_utils.py)
+    "pages": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "pages",
+        "OPTIONS": {"MAX_ENTRIES": 1000},
+    },
+}
+
 
 CI = os.environ.get("CI")
 if CI:
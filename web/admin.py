@@ -59,7 +59,17 @@ class ResourceImageAdmin(admin.ModelAdmin):
 
 
 class EmailQueueItemAdmin(admin.ModelAdmin):
-    pass
+    list_display = (
+        "id",
+        "subject",
+        "status",
+        "priority",
+        "attempts",
+        "next_attempt_at",
+        "last_error",
+        "modified",
+    )
+    list_filter = ("status",)
 
 
 class EmailNotificationTextAdmin(admin.ModelAdmin):
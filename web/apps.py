@@ -14,6 +14,7 @@ class WebConfig(AppConfig):
     CLEANUP_SEND_EMAIL_QUEUE_TASK_NAME_V1 = "clean-up send email queue v1"
     CLEANUP_TASK_NAME_V1 = "delete disabled magic links v1"
     SEND_EMAIL_TASK_NAME_V1 = "send email v1"
+    GUESS_LOCATIONS_TASK_NAME_V1 = "guess pending locations v1"
 
     def schedule_task(self, function_name, task_name, schedule_type, minutes=None):
         from django_q.tasks import schedule, Schedule
@@ -40,6 +41,9 @@ class WebConfig(AppConfig):
             )
 
     def ready(self):
+        # invalidation of cached stuff derived from resources (needed also for front-end deployment)
+        from . import signals  # noqa: F401
+
         if settings.FE_DEPLOYMENT:
             logging.warning(
                 "back-end stuff disabled => scheduling of back-end tasks skipped"
@@ -64,6 +68,12 @@ class WebConfig(AppConfig):
             Schedule.MINUTES,
             minutes=1,
         )
+        self.schedule_task(
+            "web.utils.guess_pending_locations",
+            self.GUESS_LOCATIONS_TASK_NAME_V1,
+            Schedule.MINUTES,
+            minutes=5,
+        )
         self.schedule_task(
             "web.email_utils.clean_send_email_queue",
             self.CLEANUP_SEND_EMAIL_QUEUE_TASK_NAME_V1,
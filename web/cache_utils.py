@@ -0,0 +1,40 @@
+import time
+
+from django.core.cache import caches
+
+
+# see CACHES in settings.py: state which all the processes (web workers, django-q cluster, ...) have to see
+# the same, never culled
+SHARED_CACHE_ALIAS = "shared"
+
+# Bumped whenever some `Resource` is saved or deleted (see signals.py). Everything cached which is derived
+# from resources should have this in its key so that it gets "invalidated" simply by not being used anymore.
+RESOURCE_GENERATION_KEY = "web:resource-generation"
+
+
+def get_shared_cache():
+    return caches[SHARED_CACHE_ALIAS]
+
+
+def get_resource_generation():
+    cache = get_shared_cache()
+    generation = cache.get(RESOURCE_GENERATION_KEY)
+    if generation is None:
+        # not 1 => lost counter (e.g. restart of the cache) does not start again at values which entries still
+        # present in per-process caches may have been built with
+        generation = int(time.time() * 1000)
+        # `add()` so that we do not overwrite value set meanwhile by some other process
+        if not cache.add(RESOURCE_GENERATION_KEY, generation, timeout=None):
+            generation = cache.get(RESOURCE_GENERATION_KEY, generation)
+    return generation
+
+
+def bump_resource_generation():
+    cache = get_shared_cache()
+    try:
+        return cache.incr(RESOURCE_GENERATION_KEY)
+    except ValueError:
+        # key not present (yet or anymore, e.g. after cache restart)
+        generation = get_resource_generation() + 1
+        cache.set(RESOURCE_GENERATION_KEY, generation, timeout=None)
+        return generation
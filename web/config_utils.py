@@ -0,0 +1,45 @@
+import time
+
+import arrow
+
+from django.conf import settings
+
+from constance import config
+
+
+# values are changed rarely (via admin), signal handler clears snapshot in the process where it happened,
+# other processes pick up the change after this timeout
+CONFIG_SNAPSHOT_TIMEOUT = 60
+
+
+class ConfigSnapshot:
+    """Constance settings (and values derived from them) used on (almost) every page."""
+
+    __slots__ = ("hide_resource_buttons", "cfp_open", "cfp_start", "cfp_end")
+
+    def __init__(self):
+        self.hide_resource_buttons = config.HIDE_RESOURCE_BUTTONS_IN_BASE_TEMPLACE
+        self.cfp_open = config.OEW_CFP_OPEN
+        self.cfp_start = arrow.get(self.cfp_open).datetime
+        self.cfp_end = arrow.get(settings.OEW_RANGE[1]).datetime
+
+
+# (creation time, ConfigSnapshot)
+_config_snapshot = (0, None)
+
+
+def get_config_snapshot():
+    """:return: ConfigSnapshot, at most CONFIG_SNAPSHOT_TIMEOUT seconds old"""
+    global _config_snapshot
+
+    (created, snapshot) = _config_snapshot
+    if snapshot is None or time.monotonic() - created > CONFIG_SNAPSHOT_TIMEOUT:
+        snapshot = ConfigSnapshot()
+        _config_snapshot = (time.monotonic(), snapshot)
+    return snapshot
+
+
+def clear_config_snapshot():
+    global _config_snapshot
+
+    _config_snapshot = (0, None)
@@ -1,39 +1,287 @@
+import json
+import os
+import smtplib
+import socket
+import uuid
+
 import pytz
 
 from datetime import datetime, timedelta
 
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import EmailNotificationText, EmailQueueItem
+
+
+# how much messages to send over one SMTP connection (servers tend to drop connections after some amount)
+SEND_EMAIL_CONNECTION_BATCH_SIZE = 20
+
+# how long claimed items stay reserved for the sender, should be way more than sending of one batch takes
+# (sender which did not finish by then is considered dead and items are sent by someone else)
+EMAIL_CLAIM_LEASE = timedelta(minutes=10)
+
+QUEUE_ORDER = ("priority", "modified", "id")
+
+# failed sending is retried after EMAIL_RETRY_DELAY, then after twice as much, etc. (up to EMAIL_MAX_RETRY_DELAY),
+# after EMAIL_MAX_ATTEMPTS item is marked as failed and left alone ("dead letter")
+EMAIL_MAX_ATTEMPTS = 10
+EMAIL_RETRY_DELAY = timedelta(minutes=1)
+EMAIL_MAX_RETRY_DELAY = timedelta(hours=6)
 
-from .models import EmailQueueItem
+# how long to keep sent and failed (for inspection) items, see clean_send_email_queue()
+EMAIL_SENT_RETENTION = timedelta(days=7)
+EMAIL_FAILED_RETENTION = timedelta(days=30)
 
+# see send_email_async(), mailings must not hold back notifications
+MAILING_PRIORITY = 2
 
-# how much messages to send in one minute (see scheduling of SEND_EMAIL_TASK_NAME_V1 in apps.py)
-SEND_EMAIL_BATCH_SIZE = 10
+# how much queue items to insert at once (see queue_mailing())
+MAILING_BATCH_SIZE = 500
 
+# failures related to the message itself (as opposed to e.g. connection failures) => other messages can be sent
+MESSAGE_ERRORS = (
+    smtplib.SMTPRecipientsRefused,
+    smtplib.SMTPSenderRefused,
+    smtplib.SMTPDataError,
+)
 
-def __process_email_queue_item(queue_item):
-    email = EmailMessage(
+
+def __get_email(queue_item):
+    return EmailMessage(
         queue_item.subject,
         queue_item.body,
         queue_item.from_email,
         queue_item.get_recipient_list(),
         cc=queue_item.get_cc(),
     )
-    count = email.send()
-    if count > 0:
-        print("email %d sent" % queue_item.id)
-        queue_item.status = EmailQueueItem.STATUS_SENT
-        queue_item.save()
+
+
+def get_send_email_batch_sizes(queue_depth):
+    """
+    :param queue_depth: number of unsent messages
+    :return:            list of sizes of the batches (one SMTP connection per batch) to send in this run
+    """
+    # task runs every minute (see scheduling of SEND_EMAIL_TASK_NAME_V1 in apps.py)
+    count = min(queue_depth, settings.EMAIL_QUEUE_RATE_LIMIT)
+    # spread evenly, so that there is no tiny last batch needing its own connection
+    batches = -(-count // SEND_EMAIL_CONNECTION_BATCH_SIZE)
+    return [
+        count // batches + (1 if i < count % batches else 0) for i in range(batches)
+    ]
+
+
+def get_worker_id():
+    """:return: ID unique to the caller, to tell apart items claimed by it"""
+    worker_id = "%s:%d:%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:8])
+    # see EmailQueueItem.worker_id
+    return worker_id[-64:]
+
+
+def get_retry_delay(attempts):
+    """:return: how long to wait after given number of failed attempts"""
+    # exponent capped, timedelta would overflow
+    return min(EMAIL_RETRY_DELAY * 2 ** min(attempts - 1, 30), EMAIL_MAX_RETRY_DELAY)
+
+
+def __get_claimable(now):
+    # items waiting for retry are skipped => they do not hold back the rest of the queue
+    return EmailQueueItem.objects.filter(
+        Q(status=EmailQueueItem.STATUS_UNSENT, next_attempt_at__isnull=True)
+        | Q(status=EmailQueueItem.STATUS_UNSENT, next_attempt_at__lte=now)
+        | Q(status=EmailQueueItem.STATUS_IN_PROGRESS, lease_expires__lt=now)
+    )
+
+
+def get_queue_depth():
+    """:return: number of items waiting to be sent (including ones with expired lease)"""
+    return __get_claimable(timezone.now()).count()
+
+
+def claim_queue_items(count, worker_id):
+    """
+    Reserves items for sending, so that several senders can run in parallel without sending anything twice.
+    Items are claimed with conditional UPDATE, i.e. items claimed by someone else in the meantime are skipped.
+
+    :param count:       max. number of items to claim
+    :param worker_id:   see get_worker_id()
+    :return:            list of claimed items, in order of sending
+    """
+    now = timezone.now()
+    # sender keeps dying on these (attempts are counted when claiming) => give up
+    EmailQueueItem.objects.filter(
+        status=EmailQueueItem.STATUS_IN_PROGRESS,
+        lease_expires__lt=now,
+        attempts__gte=EMAIL_MAX_ATTEMPTS,
+    ).update(
+        status=EmailQueueItem.STATUS_FAILED,
+        worker_id="",
+        lease_expires=None,
+        last_error="sending not finished in time",
+    )
+
+    candidates = list(
+        __get_claimable(now).order_by(*QUEUE_ORDER).values_list("id", flat=True)[:count]
+    )
+    __get_claimable(now).filter(id__in=candidates).update(
+        status=EmailQueueItem.STATUS_IN_PROGRESS,
+        worker_id=worker_id,
+        lease_expires=now + EMAIL_CLAIM_LEASE,
+        attempts=F("attempts") + 1,
+    )
+    return list(
+        EmailQueueItem.objects.filter(
+            id__in=candidates,
+            status=EmailQueueItem.STATUS_IN_PROGRESS,
+            worker_id=worker_id,
+        ).order_by(*QUEUE_ORDER)
+    )
+
+
+def __finish_claim(queue_items, worker_id, **values):
+    # items taken over by someone else (after lease expired) are left alone
+    EmailQueueItem.objects.filter(
+        id__in=[queue_item.id for queue_item in queue_items],
+        status=EmailQueueItem.STATUS_IN_PROGRESS,
+        worker_id=worker_id,
+    ).update(worker_id="", lease_expires=None, modified=timezone.now(), **values)
+
+
+def __record_failure(queue_item, worker_id, error):
+    print("ERROR: failed to send email %d: %s" % (queue_item.id, error))
+    if queue_item.attempts >= EMAIL_MAX_ATTEMPTS:
+        print(
+            "email %d failed %d times, giving up" % (queue_item.id, queue_item.attempts)
+        )
+        __finish_claim(
+            [queue_item],
+            worker_id,
+            status=EmailQueueItem.STATUS_FAILED,
+            last_error=error[:512],
+        )
     else:
-        print("ERROR: failed to send email %d" % queue_item.id)
+        __finish_claim(
+            [queue_item],
+            worker_id,
+            status=EmailQueueItem.STATUS_UNSENT,
+            next_attempt_at=timezone.now() + get_retry_delay(queue_item.attempts),
+            last_error=error[:512],
+        )
+
+
+def __send_batch(queue_items, worker_id):
+    """Sends claimed messages over one SMTP connection, marks sent ones as such (all at once), failed ones
+    are scheduled for retry.
+
+    :return:    number of sent messages
+    """
+    sent = []
+    failed = []
+    try:
+        with get_connection() as connection:
+            for queue_item in queue_items:
+                try:
+                    count = connection.send_messages([__get_email(queue_item)])
+                except MESSAGE_ERRORS as ex:
+                    __record_failure(queue_item, worker_id, str(ex))
+                    failed.append(queue_item)
+                    continue
+                if count > 0:
+                    print("email %d sent" % queue_item.id)
+                    sent.append(queue_item)
+                else:
+                    __record_failure(queue_item, worker_id, "not sent")
+                    failed.append(queue_item)
+    finally:
+        # even if connection broke in the middle, messages sent so far must not be sent again
+        __finish_claim(sent, worker_id, status=EmailQueueItem.STATUS_SENT)
+        # not tried at all (connection problem, not their fault) => attempt does not count
+        __finish_claim(
+            [
+                queue_item
+                for queue_item in queue_items
+                if queue_item not in sent and queue_item not in failed
+            ],
+            worker_id,
+            status=EmailQueueItem.STATUS_UNSENT,
+            attempts=F("attempts") - 1,
+        )
+    return len(sent)
 
 
 def send_email_task():
-    for queue_item in EmailQueueItem.objects.filter(
-        status=EmailQueueItem.STATUS_UNSENT
-    ).order_by("priority", "modified", "id")[:SEND_EMAIL_BATCH_SIZE]:
-        __process_email_queue_item(queue_item)
+    """Sends queued emails, safe to be run by several workers in parallel (see claim_queue_items())."""
+    worker_id = get_worker_id()
+    batch_sizes = get_send_email_batch_sizes(get_queue_depth())
+    sent = 0
+    for size in batch_sizes:
+        # claimed per batch => lease covers just one connection worth of sending
+        sent += __send_batch(claim_queue_items(size, worker_id), worker_id)
+    if len(batch_sizes) > 0:
+        print("email queue: sent %d messages in %d batches" % (sent, len(batch_sizes)))
+
+
+def queue_mailing(
+    template, resources, from_email=None, batch_size=MAILING_BATCH_SIZE, dry_run=False
+):
+    """
+    Puts one email per recipient (contact email of the resources, deduplicated case-insensitively, first resource
+    wins) into the queue. Resources are processed as a stream and queue items inserted in batches, so that even
+    thousands of recipients are processed quickly.
+
+    :param template:    `EmailNotificationText`, filled from resource (see fill_from_resource())
+    :param resources:   queryset of resources
+    :param from_email:  sender (default: settings.EMAIL_NOTIF_FROM)
+    :param batch_size:  how much queue items to insert at once
+    :param dry_run:     just count the recipients, do not put anything into the queue
+    :return:            number of queued emails
+    """
+    from_email = from_email or settings.EMAIL_NOTIF_FROM
+    total = resources.count()
+    seen = set()
+    batch = []
+    processed = 0
+    queued = 0
+
+    def flush():
+        nonlocal batch, queued
+        if not dry_run:
+            EmailQueueItem.objects.bulk_create(batch)
+        queued += len(batch)
+        batch = []
+        print(
+            "mailing: %d of %d resources processed, %d emails queued"
+            % (processed, total, queued)
+        )
+
+    for resource in (
+        resources.order_by("id")
+        .only("email", *EmailNotificationText.RESOURCE_FIELDS)
+        .iterator(chunk_size=batch_size)
+    ):
+        processed += 1
+        email = (resource.email or "").strip()
+        if not email or email.lower() in seen:
+            continue
+        seen.add(email.lower())
+
+        filled = template.fill_from_resource(resource)
+        batch.append(
+            EmailQueueItem(
+                subject=filled["subject"],
+                body=filled["body"],
+                from_email=from_email,
+                priority=MAILING_PRIORITY,
+                recipient_list=json.dumps([email]),
+            )
+        )
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+
+    return queued
 
 
 def list_queue():
@@ -41,7 +289,8 @@ def list_queue():
         "created", "modified", "id"
     ):
         print(
-            "%d: %s -> %s (cc: %s), status: %s, created: %s, modified: %s"
+            "%d: %s -> %s (cc: %s), status: %s, created: %s, modified: %s, worker: %s, lease expires: %s, "
+            "attempts: %d, next attempt: %s, last error: %s"
             % (
                 queue_item.id,
                 queue_item.from_email,
@@ -50,17 +299,38 @@ def list_queue():
                 queue_item.status,
                 queue_item.created,
                 queue_item.modified,
+                queue_item.worker_id,
+                queue_item.lease_expires,
+                queue_item.attempts,
+                queue_item.next_attempt_at,
+                queue_item.last_error,
             )
         )
 
 
 def clean_send_email_queue():
+    """Removes old sent and failed items. Unsent ones are kept, they end up either sent or failed eventually."""
     tzinfo = pytz.timezone(settings.TIME_ZONE)
-    week_ago = datetime.now(tzinfo) - timedelta(days=7)
-    count = EmailQueueItem.objects.filter(
-        status=EmailQueueItem.STATUS_UNSENT, modified__lt=week_ago
+    now = datetime.now(tzinfo)
+    sent_count = EmailQueueItem.objects.filter(
+        status=EmailQueueItem.STATUS_SENT, modified__lt=now - EMAIL_SENT_RETENTION
     ).delete()[0]
-    print("email queue clean-up: removed %d items" % count)
+    failed_count = EmailQueueItem.objects.filter(
+        status=EmailQueueItem.STATUS_FAILED,
+        modified__lt=now - EMAIL_FAILED_RETENTION,
+    ).delete()[0]
+    print(
+        "email queue clean-up: removed %d sent and %d failed items"
+        % (sent_count, failed_count)
+    )
+
+
+def retry_failed():
+    """Puts failed items back into the queue (e.g. once the problem with SMTP server or recipient is fixed)."""
+    count = EmailQueueItem.objects.filter(status=EmailQueueItem.STATUS_FAILED).update(
+        status=EmailQueueItem.STATUS_UNSENT, attempts=0, next_attempt_at=None
+    )
+    print("email queue: %d failed items queued again" % count)
 
 
 def mrproper():
@@ -0,0 +1,224 @@
+import csv
+import json
+import tempfile
+import urllib.parse
+
+from itertools import islice
+
+from django.contrib.contenttypes.models import ContentType
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font
+from openpyxl.utils import get_column_letter
+from taggit.models import TaggedItem
+
+from .models import Resource, get_resource_full_url
+
+
+# how much resources to load from DB at once (memory use does not grow with size of the export)
+EXPORT_CHUNK_SIZE = 1000
+
+# how much of XLSX file to send at once
+XLSX_STREAM_BLOCK_SIZE = 64 * 1024
+
+# (<header>, <key in JSON Lines>, <column width in XLSX>)
+EXPORT_COLUMNS = [
+    ("ID", "id", 8),
+    ("Resource Type", "resource_type", 23),
+    ("Title", "title", 23),
+    ("Organization", "organization", 31),
+    ("Contact name", "contact_name", 31),
+    ("Email", "email", 31),
+    ("OEW URL", "oew_url", 31),
+    ("Resources URL", "resources_url", 31),
+    ("Event Type", "event_type", 31),
+    ("Date and Time", "date_and_time", 31),
+    ("Country", "country", 31),
+    ("City", "city", 31),
+    ("Language", "language", 31),
+    ("Twitter", "twitter", 31),
+    ("Tags", "tags", 31),
+]
+
+# just the columns needed for the export, not the whole resource (`raw_post`, `content`, ...)
+EXPORT_FIELDS = (
+    "id",
+    "post_id",
+    "post_type",
+    "title",
+    "institution",
+    "contact",
+    "email",
+    "slug",
+    "link",
+    "event_type",
+    "event_time",
+    "country",
+    "city",
+    "form_language",
+    "twitter",
+)
+
+
+def get_export_queryset(years=None, statuses=None):
+    """
+    :param years:       list of years to export (default: all)
+    :param statuses:    list of post statuses to export (default: all)
+    """
+    resources = Resource.objects.all()
+    if years:
+        resources = resources.filter(year__in=years)
+    if statuses:
+        resources = resources.filter(post_status__in=statuses)
+    return resources.order_by("year", "id")
+
+
+def _get_tags(resource_ids):
+    """:return: {<resource ID>: "<tag>, <tag>, ..."} for given resources"""
+    tags = {}
+    for (object_id, name) in (
+        TaggedItem.objects.filter(
+            content_type=ContentType.objects.get_for_model(Resource),
+            object_id__in=resource_ids,
+        )
+        .order_by("tag__name")
+        .values_list("object_id", "tag__name")
+    ):
+        tags.setdefault(object_id, []).append(name)
+    return {object_id: ", ".join(names) for (object_id, names) in tags.items()}
+
+
+def iter_export_rows(resources):
+    """
+    :param resources:   see get_export_queryset()
+    :return:            generator of rows (lists of values in order of EXPORT_COLUMNS)
+    """
+    values = resources.values_list(*EXPORT_FIELDS).iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    )
+    while True:
+        chunk = list(islice(values, EXPORT_CHUNK_SIZE))
+        if len(chunk) <= 0:
+            break
+        # one query for tags of the whole chunk
+        tags = _get_tags([row[0] for row in chunk])
+        for (
+            id,
+            post_id,
+            post_type,
+            title,
+            institution,
+            contact,
+            email,
+            slug,
+            link,
+            event_type,
+            event_time,
+            country,
+            city,
+            form_language,
+            twitter,
+        ) in chunk:
+            yield [
+                post_id,
+                post_type,
+                urllib.parse.unquote(title),
+                institution,
+                contact,
+                email,
+                get_resource_full_url(post_type, slug),
+                link,
+                event_type,
+                event_time,
+                country,
+                city,
+                form_language,
+                twitter,
+                tags.get(id, ""),
+            ]
+
+
+class _Echo:
+    """Pseudo-buffer for csv.writer, to get the rows as strings."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for (header, _, _) in EXPORT_COLUMNS])
+    for row in rows:
+        yield writer.writerow(
+            ["" if value is None else _format_value(value) for value in row]
+        )
+
+
+def stream_jsonl(rows):
+    keys = [key for (_, key, _) in EXPORT_COLUMNS]
+    for row in rows:
+        yield json.dumps(
+            dict(zip(keys, (_format_value(value) for value in row))),
+            ensure_ascii=False,
+        ) + "\n"
+
+
+def _format_value(value):
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def stream_xlsx(rows):
+    """
+    Rows are written in write-only mode of openpyxl (i.e. without keeping them in memory) into a temporary file,
+    which is then streamed. (Unlike with CSV, nothing can be sent before the whole file is generated.)
+    """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Resources")
+    for (i, (_, _, width)) in enumerate(EXPORT_COLUMNS, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    bold = Font(bold=True)
+    header = []
+    for (title, _, _) in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = bold
+        header.append(cell)
+    ws.append(header)
+
+    wrap = Alignment(wrap_text=True)
+    for row in rows:
+        cells = []
+        for value in row:
+            if hasattr(value, "tzinfo") and value.tzinfo is not None:
+                # Excel does not know time zones, values are in UTC
+                value = value.replace(tzinfo=None)
+            cell = WriteOnlyCell(ws, value=value)
+            if hasattr(value, "isoformat"):
+                cell.number_format = "dd/mm/yyyy hh:mm"
+            else:
+                cell.alignment = wrap
+            cells.append(cell)
+        ws.append(cells)
+
+    with tempfile.TemporaryFile() as f:
+        wb.save(f)
+        f.seek(0)
+        while True:
+            block = f.read(XLSX_STREAM_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+# <format>: (<streaming function>, <content type>, <file name extension>)
+EXPORT_FORMATS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8", "csv"),
+    "jsonl": (stream_jsonl, "application/x-ndjson; charset=utf-8", "jsonl"),
+    "xlsx": (
+        stream_xlsx,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        "xlsx",
+    ),
+}
@@ -0,0 +1,55 @@
+from django.core.cache import cache
+from django.db.models import Count
+
+from .cache_utils import get_resource_generation
+from .models import Resource
+
+
+# see SCHEDULE_INDEX_TIMEOUT in schedule_utils.py
+FACETS_TIMEOUT = 5 * 60
+
+# fields (as used in `field_name` of filters in filters.py) for which we count resources
+FACET_FIELDS = ("year", "form_language", "tags__name")
+
+
+def get_years():
+    """Years for which we have some resources (newest first)."""
+    key = "web:years:%s" % get_resource_generation()
+    years = cache.get(key)
+    if years is None:
+        years = list(
+            Resource.objects.filter(year__isnull=False)
+            .values_list("year", flat=True)
+            .distinct()
+            .order_by("-year")
+        )
+        cache.set(key, years, FACETS_TIMEOUT)
+    return years
+
+
+def _count_facets(resource_list):
+    # no ordering, otherwise ordering fields would end up in GROUP BY
+    resource_list = resource_list.order_by()
+    facets = {}
+    for field in FACET_FIELDS:
+        facets[field] = dict(
+            resource_list.values_list(field).annotate(count=Count("id"))
+        )
+    return facets
+
+
+def get_library_facets(name, resource_list):
+    """
+    Returns amount of resources per value of year, language and topic.
+
+    :param name:            name of the library (e.g. "events"), identifies `resource_list` in cache
+    :param resource_list:   (lazy) query set of all the resources in the library, evaluated only if counts
+                            are not cached yet
+    :return:                dictionary <field>: {<value>: <count>, ...} for fields in FACET_FIELDS
+    """
+    key = "web:facets:%s:%s" % (name, get_resource_generation())
+    facets = cache.get(key)
+    if facets is None:
+        facets = _count_facets(resource_list)
+        cache.set(key, facets, FACETS_TIMEOUT)
+    return facets
@@ -1,15 +1,26 @@
-from django.forms.widgets import Select
+from django.forms.widgets import Select, TextInput
 
 import django_filters
 
 from .data import LANGUAGE_CHOICES_FILTER, OPENTAGS_CHOICES
+from .facet_utils import get_years
 from .models import Resource
+from .search_utils import search_resources
 
 
 SELECT_CSS_CLASS = "px-3 py-2 rounded-lg w-full text-black bg-white"
 
 
+def _year_choices():
+    return [(c, c) for c in get_years()]
+
+
 class CommonResourceFilter(django_filters.FilterSet):
+    q = django_filters.CharFilter(
+        method="filter_search",
+        label="Search",
+        widget=TextInput(attrs={"class": SELECT_CSS_CLASS, "type": "search"}),
+    )
     language = django_filters.ChoiceFilter(
         field_name="form_language",
         choices=LANGUAGE_CHOICES_FILTER,
@@ -17,22 +28,40 @@ class CommonResourceFilter(django_filters.FilterSet):
         widget=Select(attrs={"class": SELECT_CSS_CLASS}),
     )
     year = django_filters.ChoiceFilter(
-        choices=[
-            (c, c)
-            for c in Resource.objects.values_list("year", flat=True)
-            .distinct()
-            .order_by("-year")
-        ],
+        # callable => evaluated when form is rendered, not on import
+        choices=_year_choices,
         label="Year", # label="Filter by Year",
         widget=Select(attrs={"class": SELECT_CSS_CLASS}),
     )
 
+    def filter_search(self, queryset, name, value):
+        return search_resources(queryset, value)
+
+    def __init__(self, *args, facets=None, **kwargs):
+        """
+        :param facets:  counts of resources per value (see facet_utils.get_library_facets()), if given, they're
+                        shown in the choices
+        """
+        super().__init__(*args, **kwargs)
+        if facets is None:
+            return
+        for f in self.filters.values():
+            if f.field_name not in facets or "choices" not in f.extra:
+                continue
+            counts = facets[f.field_name]
+            choices = f.extra["choices"]
+            if callable(choices):
+                choices = choices()
+            f.extra["choices"] = [
+                (value, "%s (%d)" % (label, counts.get(value, 0)))
+                for (value, label) in choices
+            ]
+
 
 class AssetFilter(CommonResourceFilter):
     opentags = django_filters.ChoiceFilter(
-        field_name="opentags_csv",
+        field_name="tags__name",
         choices=OPENTAGS_CHOICES,
-        lookup_expr="contains",
         label="Topic", # label="Filter by Open tag"
         widget=Select(attrs={"class": SELECT_CSS_CLASS}),
     )
@@ -41,7 +70,7 @@ class AssetFilter(CommonResourceFilter):
         title = Resource
         fields = [
             "form_language",
-            "opentags_csv",
+            "tags",
             "year",
         ]
 
@@ -0,0 +1,76 @@
+from django.core.cache import caches
+from django.utils.timezone import get_current_timezone_name
+
+
+# see CACHES in settings.py
+FRAGMENT_CACHE_ALIAS = "fragments"
+
+# cards are keyed by `modified` so they need not expire, this is just to let unused ones go eventually
+FRAGMENT_TIMEOUT = 24 * 60 * 60
+
+# hit/miss counters (per process), see get_card_cache_stats()
+_card_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _get_cache():
+    return caches[FRAGMENT_CACHE_ALIAS]
+
+
+def _get_index_key(resource_id):
+    return "web:card-keys:%s" % resource_id
+
+
+def get_card_key(name, resource, vary_on=()):
+    """
+    :param name:        name of the card (e.g. "schedule"), as different templates render different cards
+    :param resource:    `Resource` or `EventRow` rendered in the card
+    :param vary_on:     other values used by the card, e.g. whether event is among favorites
+    """
+    parts = [
+        name,
+        resource.id,
+        resource.modified.isoformat() if resource.modified else "",
+        get_current_timezone_name(),
+    ]
+    parts.extend(vary_on)
+    return "web:card:" + ":".join(str(part) for part in parts)
+
+
+def get_or_render_card(key, resource_id, render):
+    """
+    Returns rendered card from cache, if not there, renders it (via `render()`) and stores it.
+
+    :param key:         see get_card_key()
+    :param resource_id: ID of rendered resource, to be able to evict its cards later on
+    :param render:      function returning rendered HTML of the card
+    """
+    cache = _get_cache()
+    html = cache.get(key)
+    if html is not None:
+        _card_cache_stats["hits"] += 1
+        return html
+
+    _card_cache_stats["misses"] += 1
+    html = render()
+    cache.set(key, html, FRAGMENT_TIMEOUT)
+    # remember the key so that evict_cards() can find it (losing some due to race is OK, as keys
+    # contain `modified`, so they are not used anyway after save)
+    index_key = _get_index_key(resource_id)
+    keys = cache.get(index_key, [])
+    if key not in keys:
+        keys.append(key)
+        cache.set(index_key, keys, FRAGMENT_TIMEOUT)
+    return html
+
+
+def evict_cards(resource_id):
+    """Removes all the cached cards of the resource (called when resource is saved or deleted)."""
+    cache = _get_cache()
+    index_key = _get_index_key(resource_id)
+    keys = cache.get(index_key, [])
+    cache.delete_many(keys + [index_key])
+
+
+def get_card_cache_stats():
+    """:return: {"hits": <count>, "misses": <count>} for this process"""
+    return dict(_card_cache_stats)
@@ -0,0 +1,124 @@
+import os
+import pickle
+import unicodedata
+
+import geonamescache
+
+from django.conf import settings
+
+from .data import GC
+
+
+# bump when structure of GeoIndex changes, so that stale index files get rebuilt
+GEO_INDEX_VERSION = 1
+
+
+def normalize_name(name):
+    """Case-insensitive, accent-insensitive ("Košice" == "kosice") form of the name, with whitespace collapsed."""
+    name = unicodedata.normalize("NFKD", name.casefold())
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    return " ".join(name.split())
+
+
+class GeoIndex:
+    """
+    Lookup of geonamescache cities by name (including alternate names) without scanning all of them,
+    see build_geo_index().
+    """
+
+    __slots__ = ("cities_by_name", "capitals", "cities", "countries")
+
+    def __init__(self, cities_by_name, capitals):
+        # normalized name: tuple of keys into GC.get_cities(), in the same order as there
+        self.cities_by_name = cities_by_name
+        # country ISO code: key of the capital city (if its name is unique), see get_capital()
+        self.capitals = capitals
+        self.cities = GC.get_cities()
+        self.countries = GC.get_countries_by_names()
+
+    def __getstate__(self):
+        return (self.cities_by_name, self.capitals)
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def search_cities(self, name):
+        """
+        :return:    list of cities with given name, exact (case-sensitive) matches if there are some, otherwise
+                    ones matching the normalized name
+        """
+        cities = [
+            self.cities[key]
+            for key in self.cities_by_name.get(normalize_name(name), ())
+        ]
+        exact = [
+            city
+            for city in cities
+            if city["name"] == name or name in city["alternatenames"]
+        ]
+        return exact or cities
+
+    def get_capital(self, iso):
+        """:return: city entry of capital of given country, None if unknown"""
+        key = self.capitals.get(iso)
+        return self.cities[key] if key is not None else None
+
+
+def build_geo_index():
+    cities_by_name = {}
+    cities_by_exact_name = {}
+    for (key, city) in GC.get_cities().items():
+        names = set(city["alternatenames"])
+        names.add(city["name"])
+        for name in set(normalize_name(name) for name in names):
+            cities_by_name.setdefault(name, []).append(key)
+        cities_by_exact_name.setdefault(city["name"], []).append(key)
+
+    capitals = {}
+    for country in GC.get_countries().values():
+        keys = cities_by_exact_name.get(country["capital"], [])
+        # ambiguous => better nothing than a wrong guess
+        if len(keys) == 1:
+            capitals[country["iso"]] = keys[0]
+
+    return GeoIndex(
+        {name: tuple(keys) for (name, keys) in cities_by_name.items()}, capitals
+    )
+
+
+def _get_index_header():
+    return (GEO_INDEX_VERSION, geonamescache.__version__)
+
+
+def save_geo_index(index, path=None):
+    """Stores the index (see settings.GEO_INDEX_FILE), so that processes need not build it on their own."""
+    path = path or settings.GEO_INDEX_FILE
+    tmp_path = "%s.%d" % (path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        pickle.dump((_get_index_header(), index), f, pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load_geo_index(path):
+    try:
+        with open(path, "rb") as f:
+            (header, index) = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError) as ex:
+        print("geo index not loaded from %s: %s" % (path, ex))
+        return None
+    if header != _get_index_header():
+        print("geo index in %s is outdated => ignored" % path)
+        return None
+    return index
+
+
+# loaded/built on first use, kept for the lifetime of the process
+_geo_index = None
+
+
+def get_geo_index():
+    global _geo_index
+
+    if _geo_index is None:
+        _geo_index = _load_geo_index(settings.GEO_INDEX_FILE) or build_geo_index()
+    return _geo_index
@@ -0,0 +1,67 @@
+import time
+
+import arrow
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from web.schedule_utils import (
+    get_event_day_number,
+    get_oe_week_calendar,
+    get_oe_week_range,
+)
+from web.timezone_utils import TIMEZONE_CHOICES, get_tz
+
+
+class Command(BaseCommand):
+    help = "Measures time needed to sort events into days of OE Week (per-event conversion vs. OEWeekCalendar)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--timezone", default="America/Los_Angeles")
+        parser.add_argument("--count", type=int, default=100000)
+
+    def handle(self, *args, **options):
+        tz = get_tz(options["timezone"])
+        count = options["count"]
+        start = arrow.get(settings.OEW_RANGE[0]).shift(days=-1)
+        event_times = [start.shift(seconds=7 * i).datetime for i in range(count)]
+
+        begin = time.perf_counter()
+        for event_time in event_times:
+            # as it used to be done: range computed and event converted for every event
+            get_event_day_number(event_time, tz, get_oe_week_range(tz))
+        per_event = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        for event_time in event_times:
+            get_oe_week_calendar(tz).get_day_number(event_time)
+        calendar = time.perf_counter() - begin
+
+        print(
+            "per event: %.2f us, calendar: %.2f us (%d events, %s)"
+            % (
+                per_event * 1000000 / count,
+                calendar * 1000000 / count,
+                count,
+                tz.zone,
+            )
+        )
+
+        # all the timezones at once, as done by ScheduleTable
+        for tzname in TIMEZONE_CHOICES:
+            # warm-up (calendars are cached for the lifetime of the process)
+            get_oe_week_calendar(get_tz(tzname))
+        begin = time.perf_counter()
+        event_times.sort()
+        for tzname in TIMEZONE_CHOICES:
+            get_oe_week_calendar(get_tz(tzname)).get_day_slices(event_times)
+        slices = time.perf_counter() - begin
+
+        print(
+            "all timezones: %.1f ms by slices, ~%.1f ms by calendar (%d timezones)"
+            % (
+                slices * 1000,
+                calendar * 1000 * len(TIMEZONE_CHOICES),
+                len(TIMEZONE_CHOICES),
+            )
+        )
@@ -0,0 +1,44 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+
+class Command(BaseCommand):
+    help = "Measures time and DB queries needed to render templates (for anonymous visitor)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "templates", nargs="*", default=["web/thanks.html", "web/schedule.html"]
+        )
+        parser.add_argument("--count", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = options["count"]
+        for template_name in options["templates"]:
+            request = RequestFactory().get("/", HTTP_HOST=settings.ALLOWED_HOSTS[0])
+            request.session = SessionStore()
+            request.user = AnonymousUser()
+
+            # first one is warm-up (template loading, etc.)
+            render_to_string(template_name, request=request)
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                for _ in range(count):
+                    render_to_string(template_name, request=request)
+                duration = time.perf_counter() - start
+
+            print(
+                "%s: %.3f ms, %.1f queries per render"
+                % (
+                    template_name,
+                    duration * 1000 / count,
+                    len(queries.captured_queries) / count,
+                )
+            )
@@ -0,0 +1,23 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from web.geo_utils import build_geo_index, save_geo_index
+
+
+class Command(BaseCommand):
+    help = "Builds index of cities used for guessing of locations (see GEO_INDEX_FILE setting)"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        index = build_geo_index()
+        save_geo_index(index)
+        print(
+            "geo index with %d names stored in %s (%.1f s)"
+            % (
+                len(index.cities_by_name),
+                settings.GEO_INDEX_FILE,
+                time.perf_counter() - start,
+            )
+        )
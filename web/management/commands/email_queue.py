@@ -9,12 +9,14 @@ class Command(BaseCommand):
     OP_LIST = "list"
     OP_CLEANUP = "clean"
     OP_MR_PROPER = "mrproper"
+    OP_RETRY = "retry"
 
     def add_arguments(self, parser):
         parser.add_argument(
             "operation",
-            choices=[self.OP_LIST, self.OP_CLEANUP, self.OP_MR_PROPER],
-            help="list: list; clean: remove old sent entries; mrproper: remove all entries, sent or unsent",
+            choices=[self.OP_LIST, self.OP_CLEANUP, self.OP_MR_PROPER, self.OP_RETRY],
+            help="list: list; clean: remove old sent and failed entries; mrproper: remove all entries, sent or unsent; "
+            "retry: queue failed entries again",
         )
         parser.add_argument(
             "--really-proper",
@@ -28,6 +30,9 @@ class Command(BaseCommand):
     def clean(self):
         email_utils.clean_send_email_queue()
 
+    def retry(self):
+        email_utils.retry_failed()
+
     def mr_proper(self, options):
         if not options["really_proper"]:
             raise CommandError(
@@ -43,5 +48,7 @@ class Command(BaseCommand):
             self.clean()
         elif operation == self.OP_LIST:
             self.list()
+        elif operation == self.OP_RETRY:
+            self.retry()
         else:
             raise CommandError("unknown operation: %s" % operation)
@@ -1,17 +1,63 @@
 from django.core.management.base import BaseCommand
 from django.conf import settings
 from web.models import Resource
-from web.screenshot_utils import fetch_screenshot_async
+from web.screenshot_utils import (
+    ESTIMATED_CAPTURE_TIME,
+    MAX_JOBS_PER_HOST,
+    fetch_screenshots,
+    get_screenshot_queue,
+    get_screenshot_queue_status,
+)
 
 
 class Command(BaseCommand):
     help = "Fetches screenshots"
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="number of browser processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--max-per-host",
+            type=int,
+            default=MAX_JOBS_PER_HOST,
+            help="max. number of pages loaded in parallel from one host",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="only show how many screenshots are waiting and how long it would take",
+        )
+
     def handle(self, *args, **options):
-        for resource in Resource.objects.filter(
+        resources = Resource.objects.filter(
             screenshot_status__in=["", "PENDING"],
             year=settings.OEW_YEAR,
             post_status__in=["", "draft", "publish"],
-        ):
-            print(resource.id)
-            fetch_screenshot_async(resource)
+        )
+        if options["status"]:
+            status = get_screenshot_queue_status(
+                get_screenshot_queue(resources),
+                workers=options["workers"],
+                max_per_host=options["max_per_host"],
+            )
+            print(
+                "waiting: %d resources, %d URLs, %d hosts, ETA: %d s (assuming %d s per screenshot)"
+                % (
+                    status["resources"],
+                    status["urls"],
+                    status["hosts"],
+                    status["eta"],
+                    ESTIMATED_CAPTURE_TIME,
+                )
+            )
+            return
+
+        fetch_screenshots(
+            resources,
+            workers=options["workers"],
+            max_per_host=options["max_per_host"],
+        )
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from web.cache_utils import bump_resource_generation
+from web.fragment_utils import evict_cards
+from web.models import Resource, ResourceImage
+from web.thumbnail_utils import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        "Generates thumbnails of already stored images (new ones get them when saved)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="process also images which already have thumbnails",
+        )
+
+    def handle(self, *args, **options):
+        images = ResourceImage.objects.exclude(image="")
+        resources = Resource.objects.exclude(user_image="")
+        if not options["all"]:
+            images = images.filter(thumbnail_hash="")
+            resources = resources.filter(user_image_thumbnail_hash="")
+
+        count = 0
+        image_ids = []
+        resource_ids = []
+        # update() instead of save() => no side effects (timestamps, screenshots, ...)
+        for image in images.iterator():
+            thumbnail_hash = generate_thumbnails(image.image)
+            ResourceImage.objects.filter(id=image.id).update(
+                thumbnail_hash=thumbnail_hash
+            )
+            image_ids.append(image.id)
+            count += 1
+        for resource in resources.only("id", "user_image").iterator():
+            thumbnail_hash = generate_thumbnails(resource.user_image)
+            Resource.objects.filter(id=resource.id).update(
+                user_image_thumbnail_hash=thumbnail_hash
+            )
+            resource_ids.append(resource.id)
+            count += 1
+
+        # update() does not send signals (nor changes `modified`, which cached cards are keyed by) => make cached
+        # pages and cards pick up new image URLs
+        resource_ids.extend(
+            Resource.objects.filter(image_id__in=image_ids).values_list("id", flat=True)
+        )
+        for resource_id in set(resource_ids):
+            evict_cards(resource_id)
+        bump_resource_generation()
+        print("processed %d images" % count)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from web.models import Resource
+from web.utils import guess_locations, guess_pending_locations, guess_timezones
+
+
+class Command(BaseCommand):
+    help = "Fills in missing lat/lon of all the resources and source timezone of events (based on city and country)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--pending",
+            action="store_true",
+            help="process just the resources waiting for guessing (as the scheduled task does)",
+        )
+
+    def handle(self, *args, **options):
+        if options["pending"]:
+            guess_pending_locations()
+            return
+        count = guess_locations(Resource.objects.all())
+        print("lat/lon guessed for %d resources" % count)
+        count = guess_timezones(Resource.objects.filter(post_type="event"))
+        print("timezone guessed for %d resources" % count)
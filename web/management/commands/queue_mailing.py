@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.conf import settings
+
+from web.email_utils import queue_mailing
+from web.models import EmailNotificationText, Resource
+
+
+class Command(BaseCommand):
+    help = "Queues email (filled from notification text) for contacts of all the resources of the year"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--action",
+            default=EmailNotificationText.ACTION_MAILING_CONTRIBUTORS,
+            choices=[c[0] for c in EmailNotificationText.ACTION_CHOICES],
+            help="which notification text to use",
+        )
+        parser.add_argument("--year", type=int, default=settings.OEW_YEAR)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="just count the recipients, do not put anything into the queue",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            template = EmailNotificationText.objects.get(action=options["action"])
+        except EmailNotificationText.DoesNotExist:
+            raise CommandError(
+                "no notification text for action %s, please create it in admin"
+                % options["action"]
+            )
+
+        resources = Resource.objects.filter(post_status="publish", year=options["year"])
+        queue_mailing(template, resources, dry_run=options["dry_run"])
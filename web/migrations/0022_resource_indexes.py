@@ -0,0 +1,45 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:38
+
+from django.db import migrations, models
+import django.db.models.expressions
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0021_rename_opentags_old_resource_opentags_csv"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(
+                fields=["post_type", "post_status", "year", "event_time"],
+                name="web_resource_schedule_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(
+                django.db.models.expressions.F("post_type"),
+                django.db.models.expressions.F("post_status"),
+                django.db.models.expressions.OrderBy(
+                    django.db.models.expressions.F("year"), descending=True
+                ),
+                django.db.models.functions.text.Lower("title"),
+                name="web_resource_library_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(
+                fields=["slug", "post_type", "post_status", "year"],
+                name="web_resource_slug_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="resource",
+            index=models.Index(fields=["uuid"], name="web_resource_uuid_idx"),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+from django.utils.text import slugify
+
+
+def _get_or_create_tag(Tag, name):
+    tag = Tag.objects.filter(name=name).first()
+    if tag is not None:
+        return tag
+
+    # historical models do not have taggit's slug generation => replicate it here
+    slug = base_slug = slugify(name, allow_unicode=True) or "tag"
+    i = 1
+    while Tag.objects.filter(slug=slug).exists():
+        slug = "%s_%d" % (base_slug, i)
+        i += 1
+    return Tag.objects.create(name=name, slug=slug)
+
+
+def backfill_tags(apps, schema_editor):
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    Resource = apps.get_model("web", "Resource")
+    Tag = apps.get_model("taggit", "Tag")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+
+    content_type, _ = ContentType.objects.get_or_create(
+        app_label="web", model="resource"
+    )
+
+    # tags possibly added via admin are kept
+    existing = set(
+        TaggedItem.objects.filter(content_type=content_type).values_list(
+            "object_id", "tag_id"
+        )
+    )
+
+    tags = {}
+    tagged_items = []
+    for (resource_id, opentags_csv) in (
+        Resource.objects.exclude(opentags_csv="")
+        .values_list("id", "opentags_csv")
+        .iterator()
+    ):
+        names = set(tag.strip() for tag in opentags_csv.split(",") if tag.strip())
+        for name in names:
+            if name not in tags:
+                tags[name] = _get_or_create_tag(Tag, name)
+            if (resource_id, tags[name].id) in existing:
+                continue
+            tagged_items.append(
+                TaggedItem(
+                    tag=tags[name],
+                    content_type=content_type,
+                    object_id=resource_id,
+                )
+            )
+
+    TaggedItem.objects.bulk_create(tagged_items, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("taggit", "0002_auto_20150616_2121"),
+        ("web", "0022_resource_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_tags, migrations.RunPython.noop),
+    ]
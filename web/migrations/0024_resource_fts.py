@@ -0,0 +1,22 @@
+from django.db import migrations
+
+from web.search_utils import install_fts_index, uninstall_fts_index
+
+
+def install(apps, schema_editor):
+    install_fts_index(schema_editor.connection)
+
+
+def uninstall(apps, schema_editor):
+    uninstall_fts_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0023_resource_tags_from_opentags_csv"),
+    ]
+
+    operations = [
+        migrations.RunPython(install, uninstall),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 10:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0024_resource_fts"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="user_image_thumbnail_hash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64
+            ),
+        ),
+        migrations.AddField(
+            model_name="resourceimage",
+            name="thumbnail_hash",
+            field=models.CharField(
+                blank=True, default="", editable=False, max_length=64
+            ),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0025_thumbnails"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailqueueitem",
+            name="lease_expires",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="emailqueueitem",
+            name="worker_id",
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AlterField(
+            model_name="emailqueueitem",
+            name="status",
+            field=models.CharField(
+                choices=[("s", "sent"), ("u", "not sent yet"), ("p", "being sent")],
+                default="u",
+                max_length=1,
+            ),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0026_email_queue_claiming"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="emailqueueitem",
+            name="attempts",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="emailqueueitem",
+            name="last_error",
+            field=models.CharField(blank=True, max_length=512),
+        ),
+        migrations.AddField(
+            model_name="emailqueueitem",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name="emailqueueitem",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("s", "sent"),
+                    ("u", "not sent yet"),
+                    ("p", "being sent"),
+                    ("f", "failed, gave up"),
+                ],
+                default="u",
+                max_length=1,
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="emailqueueitem",
+            index=models.Index(
+                fields=["status", "next_attempt_at", "priority"],
+                name="web_emailqueueitem_send_idx",
+            ),
+        ),
+    ]
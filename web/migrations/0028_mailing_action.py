@@ -0,0 +1,29 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0027_email_queue_retries"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="emailnotificationtext",
+            name="action",
+            field=models.CharField(
+                choices=[
+                    ("a_n", "account: new"),
+                    ("r_n", "resource: new"),
+                    ("r_a", "resource: approved"),
+                    ("r_f", "resource: feedback sent"),
+                    ("r_r", "resource: rejected"),
+                    ("m_c", "mailing: all contributors"),
+                ],
+                max_length=3,
+                unique=True,
+            ),
+        ),
+    ]
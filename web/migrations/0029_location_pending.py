@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0028_mailing_action"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="location_pending",
+            field=models.BooleanField(db_index=True, default=False, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("web", "0029_location_pending"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="resource",
+            name="event_source_timezone_guessed",
+            field=models.BooleanField(default=False),
+        ),
+    ]
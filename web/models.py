@@ -2,19 +2,23 @@ import json
 import uuid
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.conf import settings
 from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.utils.deconstruct import deconstructible
 from django.utils.text import slugify
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.auth import get_user_model
 from taggit.managers import TaggableManager
 
-from model_utils import Choices
+from model_utils import Choices, FieldTracker
 from model_utils.models import TimeStampedModel
 
 from .data import COUNTRY_CHOICES, LANGUAGE_CHOICES, LICENSE_CHOICES
+from .thumbnail_utils import generate_thumbnails, get_thumbnail_name
 
 import arrow
 
@@ -99,7 +103,84 @@ class UploadToResourceImageDir(object):
         return "{}/{}".format(self.sub_path, new_name)
 
 
-class Resource(TimeStampedModel, ReviewModel):
+class ResourceDisplayMixin:
+    """Helpers used by templates, shared by `Resource` and its read-only snapshots (see snapshot_utils.py).
+
+    Expects `event_time` and `image_url` attributes and `get_image_url_for_detail()` and `get_local_image()`
+    methods.
+    """
+
+    __slots__ = ()
+
+    @property
+    def event_time_link_to_everytimezone(self):
+        ts = self.event_time
+        noon_utc = ts.replace(hour=12, minute=0, second=0)
+        offset = int((ts - noon_utc).total_seconds() / 60)
+        return f"https://everytimezone.com/#{ts.year}-{ts.month}-{ts.day},{offset},6bj"
+
+    @property
+    def event_offset_in_hours(self):
+        then = self.event_time
+        now = djtz.now()
+
+        duration = then - now
+        duration_in_s = duration.total_seconds()
+        hours = int(divmod(duration_in_s, 3600)[0])
+        if hours == 1:
+            return "in 1 hour"
+        elif hours > 1 and hours <= 48:
+            return "in " + str(hours) + " hours"
+        else:
+            return ""
+        # FYI: https://stackoverflow.com/questions/1345827/how-do-i-find-the-time-difference-between-two-datetime-objects-in-python
+
+    def get_image_url_for_size(self, size):
+        """Same as get_image_url_for_detail() but for locally stored images returns URL of the thumbnail
+        of given size (see thumbnail_utils.THUMBNAIL_SIZES), if there is one."""
+
+        if self.image_url is None:
+            local_image = self.get_local_image()
+            if local_image is not None and local_image[1]:
+                return default_storage.url(get_thumbnail_name(local_image[1], size))
+        return self.get_image_url_for_detail()
+
+    def get_image_url_for_list(self):
+        """Same as get_image_url_for_size("list") but on-top of that does some "image size magic"
+        for images hosted on archive.org ."""
+
+        u = self.get_image_url_for_size("list")
+        if u and u.startswith("https://archive.org") and u.endswith(".png"):
+            u = u[:-4] + "-sm.png"
+
+        return u
+
+    @property
+    def consolidated_image_url_detail(self):
+        return self.get_image_url_for_size("detail")
+
+    @property
+    def consolidated_image_url_list(self):
+        return self.get_image_url_for_list()
+
+    @property
+    def consolidated_image_url_social(self):
+        return self.get_image_url_for_size("social")
+
+
+def _parse_opentags_csv(opentags_csv):
+    """:return: set of tag names in `Resource.opentags_csv` (None => empty set)"""
+    return set(tag.strip() for tag in (opentags_csv or "").split(",") if tag.strip())
+
+
+def get_resource_full_url(post_type, slug):
+    if post_type == "event":
+        return "http://www.openeducationweek.org/events/{}".format(slug)
+
+    return "http://www.openeducationweek.org/resources/{}".format(slug)
+
+
+class Resource(ResourceDisplayMixin, TimeStampedModel, ReviewModel):
     RESOURCE_TYPES = Choices(
         ("resource", "Resource"), ("project", "Project"), ("event", "Event")
     )
@@ -178,29 +259,6 @@ class Resource(TimeStampedModel, ReviewModel):
         blank=True, null=True
     )  # in TZ set in setting.py:TIME_ZONE
 
-    @property
-    def event_time_link_to_everytimezone(self):
-        ts = self.event_time
-        noon_utc = ts.replace(hour=12, minute=0, second=0)
-        offset = int((ts - noon_utc).total_seconds() / 60)
-        return f"https://everytimezone.com/#{ts.year}-{ts.month}-{ts.day},{offset},6bj"
-
-    @property
-    def event_offset_in_hours(self):
-        then = self.event_time
-        now = djtz.now()
-
-        duration = then - now
-        duration_in_s = duration.total_seconds()
-        hours = int(divmod(duration_in_s, 3600)[0])
-        if hours == 1:
-            return "in 1 hour"
-        elif hours > 1 and hours <= 48:
-            return "in " + str(hours) + " hours"
-        else:
-            return ""
-        # FYI: https://stackoverflow.com/questions/1345827/how-do-i-find-the-time-difference-between-two-datetime-objects-in-python
-
     event_type = models.CharField(
         max_length=255, blank=True, null=True, choices=EVENT_TYPES
     )
@@ -212,6 +270,9 @@ class Resource(TimeStampedModel, ReviewModel):
     event_source_timezone = models.CharField(
         max_length=255, blank=True, validators=[validate_timezone]
     )
+    # missing `event_source_timezone` of events gets inferred from city/country (see utils.guess_timezones()),
+    # such values are not to be used for conversion of `event_time` (see TODO 2 above)
+    event_source_timezone_guessed = models.BooleanField(default=False)
     event_directions = models.CharField(max_length=255, blank=True, null=True)
     event_other_text = models.CharField(max_length=255, blank=True, null=True)
     event_facilitator = models.CharField(max_length=255, blank=True, null=True)
@@ -221,6 +282,8 @@ class Resource(TimeStampedModel, ReviewModel):
 
     lat = models.FloatField(null=True, blank=True)
     lng = models.FloatField(null=True, blank=True)
+    # waiting for utils.guess_pending_locations()
+    location_pending = models.BooleanField(default=False, db_index=True, editable=False)
     address = models.CharField(blank=True, max_length=1024)
 
     categories = models.ManyToManyField(Category, blank=True)
@@ -231,6 +294,7 @@ class Resource(TimeStampedModel, ReviewModel):
     # only CharField is used, but named as 'opentags_csv' to avoid name clash with previous uses of
     # 'opentags'. And to bridge the gap between 'opentags'="list" and
     # 'opentags_csv'="string containing tags separated by comma", we're employing 'opentags()'.
+    # For filtering, 'opentags_csv' is mirrored into (indexed) 'tags', see save().
     opentags_csv = models.CharField(max_length=255, blank=True)
 
     @property
@@ -238,6 +302,10 @@ class Resource(TimeStampedModel, ReviewModel):
         """glue helping us maintain code which relied on opentags = ArrayField"""
         return self.opentags_csv.split(",")
 
+    tracker = FieldTracker(
+        fields=["opentags_csv", "user_image", "event_source_timezone"]
+    )
+
     notified = models.BooleanField(default=False)
     raw_post = models.TextField(blank=True)
 
@@ -256,6 +324,10 @@ class Resource(TimeStampedModel, ReviewModel):
         blank=True,
         validators=[validate_image],
     )
+    # see thumbnail_utils.generate_thumbnails()
+    user_image_thumbnail_hash = models.CharField(
+        blank=True, default="", max_length=64, editable=False
+    )
 
     twitter = models.CharField(blank=True, null=True, max_length=255)
     twitter_personal = models.CharField(blank=True, null=True, max_length=255)
@@ -263,6 +335,30 @@ class Resource(TimeStampedModel, ReviewModel):
 
     newsletter = models.BooleanField(default=False)
 
+    class Meta:
+        indexes = [
+            # schedule, events: post_type + post_status + year, ordered by event_time
+            models.Index(
+                fields=["post_type", "post_status", "year", "event_time"],
+                name="web_resource_schedule_idx",
+            ),
+            # library: post_type + post_status (+ year), ordered by -year + lower(title)
+            models.Index(
+                F("post_type"),
+                F("post_status"),
+                F("year").desc(),
+                Lower("title"),
+                name="web_resource_library_idx",
+            ),
+            # detail pages, old detail URLs (ordered by year) and slug uniqueness check
+            models.Index(
+                fields=["slug", "post_type", "post_status", "year"],
+                name="web_resource_slug_idx",
+            ),
+            # edit and "contribute similar" pages
+            models.Index(fields=["uuid"], name="web_resource_uuid_idx"),
+        ]
+
     @property
     def twitter_personal_url(self):
         t = self.twitter_personal
@@ -307,10 +403,7 @@ class Resource(TimeStampedModel, ReviewModel):
         return "Resource #{}".format(self.id)
 
     def get_full_url(self):
-        if self.post_type == "event":
-            return "http://www.openeducationweek.org/events/{}".format(self.slug)
-
-        return "http://www.openeducationweek.org/resources/{}".format(self.slug)
+        return get_resource_full_url(self.post_type, self.slug)
 
     def get_image_url_for_detail(self):
         """We have (or can have) several images available for each resource. Hence
@@ -328,15 +421,15 @@ class Resource(TimeStampedModel, ReviewModel):
             u = self.image.image.url
         return u
 
-    def get_image_url_for_list(self):
-        """Same as get_image_url_for_detail() but on-top of that does some "image size magic"
-        for images hosted on archive.org ."""
-
-        u = self.get_image_url_for_detail()
-        if u and u.startswith("https://archive.org") and u.endswith(".png"):
-            u = u[:-4] + "-sm.png"
+    def get_local_image(self):
+        """:return: (<name in storage>, <thumbnail hash>) of locally stored image (see get_image_url_for_detail()),
+        None if there is none"""
 
-        return u
+        if self.user_image:
+            return (self.user_image.name, self.user_image_thumbnail_hash)
+        if self.image:
+            return (self.image.image.name, self.image.thumbnail_hash)
+        return None
 
     def get_image_url(self, request=None):
         u = self.get_image_url_for_detail()
@@ -349,14 +442,6 @@ class Resource(TimeStampedModel, ReviewModel):
         else:
             return u
 
-    @property
-    def consolidated_image_url_detail(self):
-        return self.get_image_url_for_detail()
-
-    @property
-    def consolidated_image_url_list(self):
-        return self.get_image_url_for_list()
-
     def save(self, *args, **kwargs):
         if not self.slug:
             next = 0
@@ -370,8 +455,29 @@ class Resource(TimeStampedModel, ReviewModel):
         if self.firstname or self.lastname:
             self.contact = "{} {}".format(self.firstname, self.lastname)
 
+        if self.tracker.has_changed("event_source_timezone"):
+            # filled in by submitter or admin (guessing does not save the resource)
+            self.event_source_timezone_guessed = False
+
+        opentags_changed = self.tracker.has_changed("opentags_csv")
+        previous_opentags_csv = self.tracker.previous("opentags_csv")
+        if self.tracker.has_changed("user_image"):
+            self.user_image_thumbnail_hash = (
+                generate_thumbnails(self.user_image) if self.user_image else ""
+            )
+
         super().save(*args, **kwargs)
 
+        if opentags_changed:
+            # only tags derived from opentags are maintained here, others (e.g. added via admin) are kept
+            current = _parse_opentags_csv(self.opentags_csv)
+            previous = _parse_opentags_csv(previous_opentags_csv)
+            removed = previous - current
+            if removed:
+                self.tags.remove(*removed)
+            if current:
+                self.tags.add(*current)
+
     # TODO: duplicate of send_email_async() in contribute_activity() but used in serialized => find out what/why/... and clean-up/de-duplicate
     def send_new_submission_email(self):
         try:
@@ -435,15 +541,33 @@ class EmailTemplate(models.Model):
 
 class ResourceImage(models.Model):
     image = models.ImageField(upload_to="images/", blank=True)
+    # see thumbnail_utils.generate_thumbnails()
+    thumbnail_hash = models.CharField(
+        blank=True, default="", max_length=64, editable=False
+    )
+
+    tracker = FieldTracker(fields=["image"])
 
     def __str__(self):
         return repr(self.image)
 
+    def save(self, *args, **kwargs):
+        if self.tracker.has_changed("image"):
+            self.thumbnail_hash = generate_thumbnails(self.image) if self.image else ""
+        super().save(*args, **kwargs)
+
 
 class EmailQueueItem(models.Model):
     STATUS_UNSENT = "u"
+    STATUS_IN_PROGRESS = "p"
     STATUS_SENT = "s"
-    STATUS_CHOICES = Choices((STATUS_SENT, "sent"), (STATUS_UNSENT, "not sent yet"))
+    STATUS_FAILED = "f"
+    STATUS_CHOICES = Choices(
+        (STATUS_SENT, "sent"),
+        (STATUS_UNSENT, "not sent yet"),
+        (STATUS_IN_PROGRESS, "being sent"),
+        (STATUS_FAILED, "failed, gave up"),
+    )
 
     subject = models.CharField(max_length=128)
     body = models.TextField()
@@ -460,6 +584,24 @@ class EmailQueueItem(models.Model):
     # special case: we need to store list -> use json to serialize/deserialize into/from model
     # TODO: change to JSONField once we migrate back to PostgreSQL
     cc = models.CharField(max_length=512, blank=True)
+    # set when claimed by a sender (see email_utils.claim_queue_items()), item in progress with expired lease
+    # (e.g. sender crashed) can be claimed again
+    worker_id = models.CharField(max_length=64, blank=True)
+    lease_expires = models.DateTimeField(null=True, blank=True)
+    # failed sending is retried with exponential backoff (see email_utils.get_retry_delay()), not sooner
+    # than `next_attempt_at` (empty = right away)
+    attempts = models.IntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.CharField(max_length=512, blank=True)
+
+    class Meta:
+        indexes = [
+            # sending: status + next_attempt_at, ordered by priority
+            models.Index(
+                fields=["status", "next_attempt_at", "priority"],
+                name="web_emailqueueitem_send_idx",
+            ),
+        ]
 
     def get_recipient_list(self):
         if self.recipient_list:
@@ -480,7 +622,7 @@ class EmailQueueItem(models.Model):
 
 def send_email_async(subject, body, from_email, recipient_list, cc=[], priority=1):
     """
-    priority: 0 = notifications for staff, 1 = notifications for users
+    priority: 0 = notifications for staff, 1 = notifications for users, 2 = mailings (see email_utils.queue_mailing())
     """
     queue_item = EmailQueueItem.objects.create(
         subject=subject, body=body, from_email=from_email, priority=priority
@@ -497,12 +639,14 @@ class EmailNotificationText(models.Model):
     ACTION_RES_APPROVED = "r_a"
     ACTION_RES_FEEDBACK = "r_f"
     ACTION_RES_REJECTED = "r_r"
+    ACTION_MAILING_CONTRIBUTORS = "m_c"
     ACTION_CHOICES = Choices(
         (ACTION_ACCOUNT_NEW, "account: new"),
         (ACTION_RES_NEW, "resource: new"),
         (ACTION_RES_APPROVED, "resource: approved"),
         (ACTION_RES_FEEDBACK, "resource: feedback sent"),
         (ACTION_RES_REJECTED, "resource: rejected"),
+        (ACTION_MAILING_CONTRIBUTORS, "mailing: all contributors"),
     )
 
     action = models.CharField(max_length=3, choices=ACTION_CHOICES, unique=True)
@@ -512,6 +656,18 @@ class EmailNotificationText(models.Model):
         help_text="You can use the following variables in body and title: {firstname}, {lastname}, {title}, {slug1}, {slug2}, {uuid} and {year}. HTML is not allowed.",
     )
 
+    # fields of Resource used by fill_from_resource()
+    RESOURCE_FIELDS = (
+        "id",
+        "firstname",
+        "lastname",
+        "slug",
+        "title",
+        "uuid",
+        "year",
+        "post_type",
+    )
+
     def fill_from_resource(self, resource):
         """
         returns dictionary usable for initialization of ResourceFeedbackForm
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import time
+
+from django.core.cache import caches
+from django.middleware.csrf import get_token
+from django.http import HttpResponse
+from django.template.context_processors import csrf as django_csrf
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    set_response_etag,
+)
+from django.utils.decorators import decorator_from_middleware
+from django.utils.deprecation import MiddlewareMixin
+from django.utils.http import http_date
+from django.utils.timezone import get_current_timezone_name
+
+from .cache_utils import get_resource_generation
+
+
+# see CACHES in settings.py
+PAGE_CACHE_ALIAS = "pages"
+
+# pages also show current time, "coming up next" events, days to go, etc. => cache only briefly
+PAGE_CACHE_TIMEOUT = 60
+
+# stands for CSRF token in cached pages, replaced by token of the actual visitor when served
+CSRF_TOKEN_PLACEHOLDER = "__page_cache_csrf_token__"
+
+# see django.contrib.messages.storage.cookie.CookieStorage
+MESSAGES_COOKIE_NAME = "messages"
+
+
+def _get_cache():
+    return caches[PAGE_CACHE_ALIAS]
+
+
+def csrf(request):
+    """Replacement for Django's `csrf` context processor, giving placeholder instead of the token for pages
+    which are going to be cached (see AnonymousPageCacheMiddleware)."""
+    if getattr(request, "page_cache_csrf_placeholder", False):
+        return {"csrf_token": CSRF_TOKEN_PLACEHOLDER}
+    return django_csrf(request)
+
+
+def _is_cacheable_request(request):
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not request.headers.get("HX-Request")
+        and MESSAGES_COOKIE_NAME not in request.COOKIES
+    )
+
+
+def _get_page_key(request):
+    # anonymous session holds timezone, favorites, library box flags, ... => take it all
+    session_data = json.dumps(dict(request.session.items()), sort_keys=True)
+    page_hash = hashlib.md5(
+        (
+            "%s\n%s\n%s\n%s"
+            % (
+                request.get_host(),
+                request.get_full_path(),
+                session_data,
+                # timezone can be also guessed from Accept-Language (see TimezoneMiddleware)
+                get_current_timezone_name(),
+            )
+        ).encode("UTF-8")
+    ).hexdigest()
+    return "web:page:%s:%s" % (get_resource_generation(), page_hash)
+
+
+def _serve(request, content, content_type, etag, last_modified):
+    response = HttpResponse(
+        content.replace(
+            CSRF_TOKEN_PLACEHOLDER.encode("ascii"),
+            get_token(request).encode("ascii"),
+        ),
+        content_type=content_type,
+    )
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # content depends on session => browsers have to ask (but will likely get 304)
+    patch_cache_control(response, private=True, no_cache=True)
+    return (
+        get_conditional_response(
+            request, etag=etag, last_modified=last_modified, response=response
+        )
+        or response
+    )
+
+
+class AnonymousPageCacheMiddleware(MiddlewareMixin):
+    """
+    Caches whole pages served to anonymous visitors, per URL and session (timezone, favorites, ...) until some
+    resource is saved (or PAGE_CACHE_TIMEOUT elapses). Pages are served with ETag and Last-Modified
+    and conditional requests are answered with 304.
+
+    Meant to be used via `cache_anonymous_page` decorator, for views which do not change anything (including
+    session) when showing the page to anonymous visitor.
+    """
+
+    def process_request(self, request):
+        if not _is_cacheable_request(request):
+            return None
+
+        request.page_cache_csrf_placeholder = True
+        request.page_cache_key = _get_page_key(request)
+        cached = _get_cache().get(request.page_cache_key)
+        if cached is None:
+            return None
+        return _serve(request, *cached)
+
+    def process_exception(self, request, exception):
+        # e.g. Http404, error page is rendered later on, outside of this middleware => needs real CSRF token
+        request.page_cache_csrf_placeholder = False
+        return None
+
+    def process_response(self, request, response):
+        if not getattr(request, "page_cache_csrf_placeholder", False):
+            return response
+        if (
+            response.status_code != 200
+            or response.streaming
+            or response.cookies
+            or request.session.modified
+        ):
+            # not for all visitors (or view has side effects) => not cached, just fix CSRF token
+            if not response.streaming:
+                response.content = response.content.replace(
+                    CSRF_TOKEN_PLACEHOLDER.encode("ascii"),
+                    get_token(request).encode("ascii"),
+                )
+            return response
+
+        set_response_etag(response)
+        cached = (
+            response.content,
+            response["Content-Type"],
+            response["ETag"],
+            int(time.time()),
+        )
+        _get_cache().set(request.page_cache_key, cached, PAGE_CACHE_TIMEOUT)
+        return _serve(request, *cached)
+
+
+cache_anonymous_page = decorator_from_middleware(AnonymousPageCacheMiddleware)
@@ -0,0 +1,160 @@
+import base64
+import hashlib
+import json
+
+from datetime import datetime
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .cache_utils import get_resource_generation
+
+
+# see SCHEDULE_INDEX_TIMEOUT in schedule_utils.py
+COUNT_TIMEOUT = 5 * 60
+
+
+class KeysetPage:
+    """One page of results of keyset (a.k.a. cursor) pagination, see `paginate_keyset()`."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    @property
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+
+def _json_default(value):
+    # unlike DjangoJSONEncoder, keep microseconds (we need exact values for comparison)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError("%s not serializable" % type(value))
+
+
+def encode_cursor(values, backwards=False):
+    data = json.dumps([values, backwards], default=_json_default)
+    return base64.urlsafe_b64encode(data.encode("UTF-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """:raises ValueError: on malformed cursor"""
+    try:
+        (values, backwards) = json.loads(
+            base64.urlsafe_b64decode(cursor.encode("ascii"))
+        )
+    except (TypeError, UnicodeError, json.JSONDecodeError) as ex:
+        raise ValueError("invalid cursor: %s" % ex)
+    if not isinstance(values, list) or not isinstance(backwards, bool):
+        raise ValueError("invalid cursor")
+    return (values, backwards)
+
+
+def _get_ordering_keys(queryset):
+    """:return: [(<field or annotation name>, <descending>), ...] based on ordering of `queryset`"""
+    keys = []
+    for item in queryset.query.order_by:
+        if not isinstance(item, str):
+            raise ValueError(
+                "keyset pagination needs ordering by names (annotate expressions): %s"
+                % item
+            )
+        if item.startswith("-"):
+            keys.append((item[1:], True))
+        else:
+            keys.append((item, False))
+    if len(keys) <= 0 or keys[-1][0] not in ("id", "pk"):
+        raise ValueError("keyset pagination needs ordering ending with unique 'id'")
+    return keys
+
+
+def _get_after_filter(keys, values, backwards):
+    # (k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... (with "<" for descending keys, all flipped for backwards)
+    result = Q()
+    for i, (name, descending) in enumerate(keys):
+        lookup = "lt" if descending != backwards else "gt"
+        q = Q(**{"%s__%s" % (name, lookup): values[i]})
+        for (prev_name, _), prev_value in zip(keys[:i], values[:i]):
+            q &= Q(**{prev_name: prev_value})
+        result |= q
+    return result
+
+
+def paginate_keyset(queryset, cursor, per_page):
+    """
+    Returns page of results following (or preceding) given cursor. Unlike with `Paginator`, there is no
+    COUNT(*) and no OFFSET, so deep pages cost the same as first one.
+
+    :param queryset:    ordered query set, ordering has to be by field/annotation names and end with `id`
+                        (rows with NULL in any of the ordering fields are skipped)
+    :param cursor:      `next_cursor` or `previous_cursor` of previous page, None for first page
+    :param per_page:    maximum amount of results on the page
+    :return:            KeysetPage
+    :raises ValueError: on malformed cursor
+    """
+    keys = _get_ordering_keys(queryset)
+    for (name, _) in keys:
+        queryset = queryset.exclude(**{"%s__isnull" % name: True})
+
+    backwards = False
+    if cursor:
+        (values, backwards) = decode_cursor(cursor)
+        if len(values) != len(keys):
+            raise ValueError("invalid cursor: values do not match ordering")
+        queryset = queryset.filter(_get_after_filter(keys, values, backwards))
+        if backwards:
+            queryset = queryset.reverse()
+
+    object_list = list(queryset[: per_page + 1])
+    has_more = len(object_list) > per_page
+    object_list = object_list[:per_page]
+    if backwards:
+        object_list.reverse()
+    if len(object_list) <= 0:
+        return KeysetPage(object_list)
+
+    def get_cursor(obj, backwards):
+        return encode_cursor([getattr(obj, name) for (name, _) in keys], backwards)
+
+    next_cursor = None
+    if has_more or backwards:
+        next_cursor = get_cursor(object_list[-1], False)
+    previous_cursor = None
+    if (has_more and backwards) or (cursor and not backwards):
+        previous_cursor = get_cursor(object_list[0], True)
+
+    return KeysetPage(object_list, next_cursor, previous_cursor)
+
+
+def get_cached_count(name, params, queryset):
+    """
+    Returns `queryset.count()`, cached until some resource is saved.
+
+    :param name:        name of the list (e.g. "events"), together with `params` identifies `queryset` in cache
+    :param params:      parameters (e.g. filters) used to construct `queryset`
+    """
+    params_hash = hashlib.md5(
+        json.dumps(sorted(params.items())).encode("UTF-8")
+    ).hexdigest()
+    key = "web:count:%s:%s:%s" % (name, get_resource_generation(), params_hash)
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_TIMEOUT)
+    return count
@@ -0,0 +1,236 @@
+import arrow
+
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+
+import django.utils.timezone as djtz
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .cache_utils import get_resource_generation
+from .timezone_utils import TIMEZONE_CHOICES, get_tz
+
+
+# Safety net: signals (see signals.py) take care of invalidation but with per-process cache (e.g. locmem) other
+# processes will not see the bump of resource generation => make sure they do not serve stale schedule for too long.
+SCHEDULE_INDEX_TIMEOUT = 5 * 60
+
+# ScheduleTable needs calendars of all the timezones => keep them all (they are small and never change)
+OE_WEEK_CALENDAR_CACHE_SIZE = len(TIMEZONE_CHOICES)
+
+
+def _init_oe_week_days(tz=None):
+    oe_week_days = []
+
+    start_day = arrow.get(settings.OEW_RANGE[0], tzinfo=tz or djtz.utc)
+    end_day = arrow.get(settings.OEW_RANGE[1], tzinfo=tz or djtz.utc)
+    day = start_day
+    while day < end_day:
+        # TODO: use proper class instead of tuple, so that we can use say `name` instead of `1` in the code and templates
+        oe_week_days.append(
+            (day.format("dddd"), day.format("dddd, MMMM D"), day.format("d"))
+        )
+        day = day.shift(days=1)
+    oe_week_days.append(("Other", "Other days", "other"))
+
+    return oe_week_days
+
+
+EO_WEEK_DAYS = _init_oe_week_days()
+
+
+def get_oe_week_range(tz):
+    """Start and end of OE Week (as in `settings.OEW_RANGE`) in given timezone."""
+    return (
+        arrow.get(settings.OEW_RANGE[0], tzinfo=tz).datetime,
+        arrow.get(settings.OEW_RANGE[1], tzinfo=tz).datetime,
+    )
+
+
+def get_event_day_number(event_time, tz, oew_range):
+    """
+    Straightforward (but slow, as it converts every event time into `tz`) version of
+    OEWeekCalendar.get_day_number().
+
+    :param event_time:  time of the event (aware datetime)
+    :param tz:          timezone of the user
+    :param oew_range:   (start, end) of OE Week in `tz`, see `get_oe_week_range()`
+    :return:            day number as used in `EO_WEEK_DAYS`
+    """
+    if not event_time:
+        return "other"
+    if event_time >= oew_range[0] and event_time <= oew_range[1]:
+        return event_time.astimezone(tz).strftime("%w")
+    return "other"
+
+
+class OEWeekCalendar:
+    """OE Week as seen from one timezone, see get_oe_week_calendar()."""
+
+    __slots__ = ("tz", "start", "end", "_days", "_day_starts", "_day_numbers")
+
+    def __init__(self, tz):
+        self.tz = tz
+        # in UTC, as are event times from DB => comparisons need no conversions
+        (self.start, self.end) = (t.astimezone(djtz.utc) for t in get_oe_week_range(tz))
+        self._days = None
+
+        # start of each day of OE Week (local midnight, in UTC) and its number
+        self._day_starts = []
+        self._day_numbers = []
+        local_start = self.start.astimezone(tz)
+        day = local_start.date()
+        while True:
+            midnight = tz.localize(datetime.combine(day, time())).astimezone(djtz.utc)
+            if midnight > self.end:
+                break
+            self._day_starts.append(max(midnight, self.start))
+            self._day_numbers.append(day.strftime("%w"))
+            day += timedelta(days=1)
+
+    @property
+    def days(self):
+        """see EO_WEEK_DAYS (formatted only when needed, ScheduleTable does not need them)"""
+        if self._days is None:
+            self._days = _init_oe_week_days(self.tz)
+        return self._days
+
+    def get_day_number(self, event_time):
+        """
+        :param event_time:  time of the event (aware datetime)
+        :return:            day number as used in `EO_WEEK_DAYS`
+        """
+        if not event_time or event_time < self.start or event_time > self.end:
+            return "other"
+        return self._day_numbers[bisect_right(self._day_starts, event_time) - 1]
+
+    def get_day_slices(self, event_times):
+        """
+        Splits sorted event times into days of OE Week without looking at the events one by one: each day
+        is a continuous slice, found by bisecting with start of the day.
+
+        :param event_times: sorted times of the events (aware datetimes, no None)
+        :return:            (<start>, <end>, ((<day number>, <from>, <to>), ...)), `event_times[start:end]`
+                            are events within OE Week, `event_times[from:to]` are events of given day
+        """
+        start = bisect_left(event_times, self.start)
+        end = bisect_right(event_times, self.end)
+        bounds = [bisect_left(event_times, t, start, end) for t in self._day_starts]
+        bounds.append(end)
+        return (
+            start,
+            end,
+            tuple(
+                (number, bounds[i], bounds[i + 1])
+                for (i, number) in enumerate(self._day_numbers)
+            ),
+        )
+
+
+@lru_cache(maxsize=OE_WEEK_CALENDAR_CACHE_SIZE)
+def get_oe_week_calendar(tz):
+    """:param tz: timezone (pytz) of the user"""
+    return OEWeekCalendar(tz)
+
+
+def _build_schedule_index(event_list, tz):
+    index = {}
+    for (_, _, number) in EO_WEEK_DAYS:
+        index[number] = []
+
+    calendar = get_oe_week_calendar(tz)
+    for (event_id, event_time) in event_list.values_list("id", "event_time"):
+        index[calendar.get_day_number(event_time)].append(event_id)
+
+    return index
+
+
+class ScheduleTable:
+    """
+    Days of OE Week of all the events of one year, for all the TIMEZONE_CHOICES at once, see
+    get_schedule_table(). Events are sorted by time just once, days are then slices of them (see
+    OEWeekCalendar.get_day_slices()), so building the table costs the same for 400+ timezones as sorting
+    events into days for one timezone event by event used to.
+    """
+
+    __slots__ = ("event_ids", "untimed_ids", "slices")
+
+    def __init__(self, event_list, timezones=TIMEZONE_CHOICES):
+        """
+        :param event_list:  query set of the events, ordered by `event_time` (order of events in the same time
+                            is kept)
+        :param timezones:   names of the timezones to precompute days for
+        """
+        timed = []
+        self.untimed_ids = []
+        for (event_id, event_time) in event_list.values_list("id", "event_time"):
+            if event_time:
+                timed.append((event_time, event_id))
+            else:
+                self.untimed_ids.append(event_id)
+        # stable => same order as in `event_list` for events in the same time
+        timed.sort(key=lambda row: row[0])
+        event_times = [event_time for (event_time, _) in timed]
+        self.event_ids = [event_id for (_, event_id) in timed]
+
+        # <timezone name>: see OEWeekCalendar.get_day_slices()
+        self.slices = {}
+        for tzname in timezones:
+            self.slices[tzname] = get_oe_week_calendar(get_tz(tzname)).get_day_slices(
+                event_times
+            )
+
+    def get_index(self, tzname):
+        """:return: see get_schedule_index(), None if `tzname` is not in the table"""
+        if tzname not in self.slices:
+            return None
+        (start, end, days) = self.slices[tzname]
+
+        index = {}
+        for (_, _, number) in EO_WEEK_DAYS:
+            index[number] = []
+        for (number, begin, stop) in days:
+            index[number].extend(self.event_ids[begin:stop])
+        index["other"] = (
+            self.event_ids[:start] + self.event_ids[end:] + self.untimed_ids
+        )
+        return index
+
+
+def get_schedule_table(year, event_list):
+    """
+    :param year:        year of the events in `event_list`
+    :param event_list:  (lazy) query set of all the events for `year`, ordered by `event_time`, evaluated only if
+                        table is not cached yet
+    :return:            ScheduleTable
+    """
+    key = "web:schedule-table:%s:%s" % (year, get_resource_generation())
+    table = cache.get(key)
+    if table is None:
+        table = ScheduleTable(event_list)
+        cache.set(key, table, SCHEDULE_INDEX_TIMEOUT)
+    return table
+
+
+def get_schedule_index(year, tz, event_list):
+    """
+    Returns ordered IDs of events per day of OE Week, as seen from given timezone.
+
+    :param year:        year of the events in `event_list`
+    :param tz:          timezone of the user
+    :param event_list:  (lazy) query set of all the events for `year`, ordered by `event_time`, evaluated only if
+                        index is not cached yet
+    :return:            dictionary <day number in EO_WEEK_DAYS>: [<event ID>, ...]
+    """
+    # table is much bigger than index for one timezone => it is read only to build the index
+    key = "web:schedule-index:%s:%s:%s" % (year, tz.zone, get_resource_generation())
+    index = cache.get(key)
+    if index is None:
+        index = get_schedule_table(year, event_list).get_index(tz.zone)
+        if index is None:
+            # timezone not among TIMEZONE_CHOICES (e.g. an alias like "US/Pacific")
+            index = _build_schedule_index(event_list, tz)
+        cache.set(key, index, SCHEDULE_INDEX_TIMEOUT)
+    return index
@@ -1,18 +1,25 @@
+import logging
+import math
+import multiprocessing
 import os
 import sys
-import tempfile
 import time
 
+from collections import Counter
+from multiprocessing.connection import wait
+from urllib.parse import urlparse
+
 from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import connections
 
 # special case for "front-end deployment" with "back-end stuff" not installed:
 if not settings.FE_DEPLOYMENT:
-    from PyQt5.QtCore import Qt, QUrl
+    from PyQt5.QtCore import QBuffer, QEventLoop, QIODevice, Qt, QTimer, QUrl
     from PyQt5.QtGui import QImage, QPainter
     from PyQt5.QtWidgets import QApplication
     from PyQt5.QtWebKitWidgets import QWebView
 
-    from django.core.files import File
     from django_q.tasks import async_task
 else:
     QWebView = object
@@ -30,17 +37,26 @@ class Screenshot(QWebView):
     DESIRED_WIDTH = 1024
     DESIRED_HEIGHT = 768
     MAX_LOAD_TIME = 15 * 1000  # in milliseconds
+    IMAGE_FORMAT = "JPG"
+    IMAGE_QUALITY = 85
 
     def __init__(self):
-        self.app = QApplication(sys.argv)
+        # there can be only one QApplication per process
+        self.app = QApplication.instance() or QApplication(sys.argv)
         QWebView.__init__(self)
         self._loaded = False
         self.loadFinished.connect(self._loadFinished)
 
-    def capture(self, url, output_file):
-        print("loading %s ..." % url)
+    def capture(self, url):
+        """
+        :return:    (<encoded image (bytes)>, <time it took to load the page (in seconds)>)
+        :raises FetchScreenshotTimeout: if page did not load in MAX_LOAD_TIME
+        """
+        logging.info("loading %s ...", url)
+        self._loaded = False
         self.load(QUrl(url))
-        self.wait_load()
+        load_time = self.wait_load()
+        logging.info("loaded in %.1f s: %s", load_time, url)
         # set to webpage size
         frame = self.page().mainFrame()
         size = frame.contentsSize()
@@ -54,34 +70,84 @@ class Screenshot(QWebView):
         painter = QPainter(image)
         frame.render(painter)
         painter.end()
-        print("saving %s ..." % output_file)
-        image.save(output_file)
-
-    def wait_load(self, delay=0.01):
-        # process app events until page loaded
-        start_time = time.process_time()
-        while not self._loaded:
+        # encoded in memory, result is stored directly into the storage (see _store_screenshot())
+        buffer = QBuffer()
+        buffer.open(QIODevice.WriteOnly)
+        image.save(buffer, self.IMAGE_FORMAT, self.IMAGE_QUALITY)
+        buffer.close()
+        return (bytes(buffer.data()), load_time)
+
+    def wait_load(self):
+        """
+        Processes app events until page is loaded or MAX_LOAD_TIME (wall-clock) elapses, whichever comes first.
+        On timeout, loading is aborted.
+
+        :return:    load time (in seconds)
+        :raises FetchScreenshotTimeout: if loading took too long
+        """
+        start_time = time.monotonic()
+        if not self._loaded:
+            # no polling: event loop runs until either page is loaded or timer fires
+            loop = QEventLoop()
+            timer = QTimer()
+            timer.setSingleShot(True)
+            timer.timeout.connect(loop.quit)
+            self.loadFinished.connect(loop.quit)
+            timer.start(self.MAX_LOAD_TIME)
+            loop.exec_()
+            timer.stop()
+            self.loadFinished.disconnect(loop.quit)
+        load_time = time.monotonic() - start_time
+
+        if not self._loaded:
+            self.stop()
+            # let the abort be processed (e.g. `loadFinished(False)`), so that it does not affect next load
             self.app.processEvents()
-            time.sleep(delay)
-            if (time.process_time() - start_time) > self.MAX_LOAD_TIME:
-                raise FetchScreenshotTimeout("loading took too long: %s" % self.url())
+            self._loaded = False
+            logging.warning(
+                "loading aborted after %.1f s: %s", load_time, self.url().toString()
+            )
+            raise FetchScreenshotTimeout(
+                "loading took too long (%.1f s): %s"
+                % (load_time, self.url().toString())
+            )
         self._loaded = False
+        return load_time
 
     def _loadFinished(self, result):
         self._loaded = True
 
 
 class FetchScreenshotResult:
-    def __init__(self, id, fn, exception):
+    def __init__(self, id, image, exception, load_time=None):
         self.resource_id = id
-        self.result_fn = fn
+        # encoded image (bytes), None in case of failure => result can be passed between processes and machines
+        self.image = image
         self.exception = exception
+        # in seconds, None if not known (e.g. page did not load)
+        self.load_time = load_time
 
 
 def _abort_needed(resource):
     return not (resource.link and resource.screenshot_status in ["", "PENDING"])
 
 
+# browser kept warm for all the captures done in the process, see _get_screenshot()
+_screenshot = None
+
+
+def _get_screenshot():
+    global _screenshot
+
+    if _screenshot is None:
+        _screenshot = Screenshot()
+    return _screenshot
+
+
+def _fetch_failed(resource_ids):
+    Resource.objects.filter(pk__in=resource_ids).update(screenshot_status="PENDING")
+
+
 def _fetch_screenshot(resource):
     if _abort_needed(resource):
         print("screenshot fetching aborted (early): %d" % resource.id)
@@ -92,32 +158,272 @@ def _fetch_screenshot(resource):
             % (resource.id, resource.image.image.name)
         )
 
-    result_dir = tempfile.mkdtemp(prefix="oe_week-resource-screenshot-")
-    result_fn = os.path.join(result_dir, "%s.jpg" % resource.uuid)
-
     try:
-        s = Screenshot()
-        s.capture(resource.link, result_fn)
-        result = FetchScreenshotResult(resource.id, result_fn, None)
+        (image, load_time) = _get_screenshot().capture(resource.link)
+        result = FetchScreenshotResult(resource.id, image, None, load_time)
     except FetchScreenshotTimeout as ex:
         print("failed to fetch screenshot: %s" % ex)
-        resource.screenshot_status = "PENDING"
-        resource.save()
-
-        try:
-            os.remove(result_fn)
-        except FileNotFoundError:
-            pass
-        try:
-            os.rmdir(result_dir)
-        except FileNotFoundError:
-            pass
-
+        _fetch_failed([resource.id])
         result = FetchScreenshotResult(None, None, ex)
 
     return result
 
 
+def _screenshot_worker(conn):
+    """Runs in worker process of ScreenshotWorkerPool: captures screenshots with one browser instance."""
+    screenshot = _get_screenshot()
+    while True:
+        job = conn.recv()
+        if job is None:
+            break
+        (resource_id, url) = job
+        try:
+            (image, load_time) = screenshot.capture(url)
+            conn.send(FetchScreenshotResult(resource_id, image, None, load_time))
+        except FetchScreenshotTimeout as ex:
+            conn.send(FetchScreenshotResult(resource_id, None, ex))
+
+
+class _Worker:
+    __slots__ = ("process", "conn", "job", "deadline")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.job = None
+        self.deadline = None
+
+
+class ScreenshotWorkerPool:
+    """
+    Pool of worker processes, each with its own browser instance kept for all the captures it does.
+
+    Each capture (job) runs with a timeout, worker which crashes or hangs is killed and replaced, so that
+    the rest of the jobs is not affected.
+    """
+
+    # on top of Screenshot.MAX_LOAD_TIME: rendering and saving of the image
+    JOB_TIMEOUT = Screenshot.MAX_LOAD_TIME / 1000 + 30  # in seconds
+
+    def __init__(self, size=None, job_timeout=JOB_TIMEOUT, max_per_host=None):
+        """
+        :param size:            number of worker processes (default: number of CPUs)
+        :param job_timeout:     max. time for one capture (in seconds)
+        :param max_per_host:    max. number of captures running in parallel for one host (default: no limit)
+        """
+        self.size = size or os.cpu_count() or 1
+        self.job_timeout = job_timeout
+        self.max_per_host = max_per_host
+        # workers need no DB, they just inherit Django & Qt imports
+        self._context = multiprocessing.get_context("fork")
+
+    def _start_worker(self):
+        (conn, worker_conn) = self._context.Pipe()
+        process = self._context.Process(
+            target=_screenshot_worker, args=(worker_conn,), daemon=True
+        )
+        process.start()
+        worker_conn.close()
+        return _Worker(process, conn)
+
+    def _stop_worker(self, worker, kill=False):
+        if not kill:
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                kill = True
+        if not kill:
+            worker.process.join(5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+
+    def _pop_job(self, pending, workers):
+        """:return: first of the pending jobs for which host limit is not reached yet, None if none"""
+        if self.max_per_host is None:
+            return pending.pop(0)
+        in_flight = Counter(_get_host(w.job[1]) for w in workers if w.job is not None)
+        for (i, job) in enumerate(pending):
+            if in_flight[_get_host(job[1])] < self.max_per_host:
+                return pending.pop(i)
+        return None
+
+    def run(self, jobs):
+        """
+        Captures screenshots.
+
+        :param jobs:    list of (<resource ID>, <URL>), in order of priority
+        :return:        generator of FetchScreenshotResult, in order of completion (`exception` set in case
+                        of failure)
+        """
+        pending = list(jobs)
+        workers = []
+        # forked worker would share DB connection with us
+        connections.close_all()
+        try:
+            while True:
+                idle = [w for w in workers if w.job is None]
+                while len(pending) > 0 and (len(idle) > 0 or len(workers) < self.size):
+                    job = self._pop_job(pending, workers)
+                    if job is None:
+                        break
+                    if len(idle) > 0:
+                        worker = idle.pop()
+                    else:
+                        worker = self._start_worker()
+                        workers.append(worker)
+                    worker.job = job
+                    worker.deadline = time.monotonic() + self.job_timeout
+                    try:
+                        worker.conn.send(worker.job)
+                    except (BrokenPipeError, OSError):
+                        pass  # worker died, handled below
+                busy = [w for w in workers if w.job is not None]
+                if len(busy) <= 0:
+                    break
+
+                timeout = max(0, min(w.deadline for w in busy) - time.monotonic())
+                ready = wait(
+                    [w.conn for w in busy] + [w.process.sentinel for w in busy],
+                    timeout,
+                )
+                for worker in busy:
+                    result = None
+                    if worker.conn in ready:
+                        try:
+                            result = worker.conn.recv()
+                        except EOFError:
+                            pass
+                    elif (
+                        worker.process.sentinel not in ready
+                        and time.monotonic() < worker.deadline
+                    ):
+                        continue
+
+                    if result is None:
+                        # crashed or hanging => replace worker
+                        (resource_id, url) = worker.job
+                        result = FetchScreenshotResult(
+                            resource_id,
+                            None,
+                            FetchScreenshotTimeout("worker failed: %s" % url),
+                        )
+                        self._stop_worker(worker, kill=True)
+                        workers.remove(worker)
+                    else:
+                        worker.job = None
+                    yield result
+        finally:
+            for worker in workers:
+                self._stop_worker(worker, kill=worker.job is not None)
+
+
+# see ScreenshotWorkerPool.max_per_host
+MAX_JOBS_PER_HOST = 2
+
+# used for ETA only (see get_screenshot_queue_status())
+ESTIMATED_CAPTURE_TIME = 5  # in seconds
+
+
+def _get_host(url):
+    return (urlparse(url).hostname or "").lower()
+
+
+def get_screenshot_queue(resources):
+    """
+    Groups resources needing screenshot by their link, so that every URL is rendered only once.
+
+    :param resources:   resources needing screenshots
+    :return:            list of (<URL>, [<resource>, ...]), published resources first
+    """
+    groups = {}
+    for resource in resources:
+        if _abort_needed(resource):
+            print("screenshot fetching aborted (early): %d" % resource.id)
+            continue
+        groups.setdefault(resource.link.strip(), []).append(resource)
+
+    def priority(item):
+        (_, group) = item
+        published = any(r.post_status == Resource.POST_STATUS_PUBLISH for r in group)
+        return (0 if published else 1, min(r.id for r in group))
+
+    return sorted(groups.items(), key=priority)
+
+
+def get_screenshot_queue_status(
+    queue,
+    workers=None,
+    max_per_host=MAX_JOBS_PER_HOST,
+    capture_time=ESTIMATED_CAPTURE_TIME,
+):
+    """
+    :param queue:           see get_screenshot_queue()
+    :param workers:         number of worker processes (default: number of CPUs)
+    :param max_per_host:    see ScreenshotWorkerPool
+    :param capture_time:    expected time of one capture (in seconds)
+    :return:                dictionary with amount of resources, URLs and hosts in the queue and ETA (in seconds)
+    """
+    workers = workers or os.cpu_count() or 1
+    urls_per_host = Counter(_get_host(url) for (url, _) in queue)
+    # limited either by number of workers or by the host with most URLs
+    rounds = max(
+        [math.ceil(len(queue) / workers)]
+        + [math.ceil(count / max_per_host) for count in urls_per_host.values()]
+    )
+    return {
+        "resources": sum(len(group) for (_, group) in queue),
+        "urls": len(queue),
+        "hosts": len(urls_per_host),
+        "eta": rounds * capture_time,
+    }
+
+
+def fetch_screenshots(resources, workers=None, max_per_host=MAX_JOBS_PER_HOST):
+    """
+    Fetches screenshots for given resources (in parallel, see ScreenshotWorkerPool) and stores them. Every URL
+    is rendered only once, resulting image is used for all the resources with that link.
+
+    :param resources:       resources needing screenshots
+    :param workers:         number of worker processes (default: number of CPUs)
+    :param max_per_host:    max. number of captures running in parallel for one host
+    :return:                dictionary <URL>: <load time in seconds or None if page did not load>
+    """
+    if settings.FE_DEPLOYMENT:
+        print("WARNING, back-end stuff disabled => fetching of screenshots skipped")
+        return {}
+
+    groups = {}
+    jobs = []
+    for (url, group) in get_screenshot_queue(resources):
+        groups[group[0].id] = [r.id for r in group]
+        jobs.append((group[0].id, url))
+
+    urls = dict(jobs)
+    load_times = {}
+    pool = ScreenshotWorkerPool(workers, max_per_host=max_per_host)
+    for result in pool.run(jobs):
+        load_times[urls[result.resource_id]] = result.load_time
+        resource_ids = groups[result.resource_id]
+        if result.exception is not None:
+            print("failed to fetch screenshot: %s" % result.exception)
+            _fetch_failed(resource_ids)
+            continue
+        _store_screenshot(resource_ids, result.image)
+
+    loaded = [t for t in load_times.values() if t is not None]
+    if len(loaded) > 0:
+        logging.info(
+            "pages loaded: %d of %d, load time avg. %.1f s, max. %.1f s",
+            len(loaded),
+            len(load_times),
+            sum(loaded) / len(loaded),
+            max(loaded),
+        )
+    return load_times
+
+
 def fetch_screenshot_async(resource):
     if settings.FE_DEPLOYMENT:
         print("WARNING, back-end stuff disabled => fetching of screenshot skipped")
@@ -138,25 +444,28 @@ def process_fetch_screenshot_result(task):
         # screenshot was already present
         return
 
-    resource_id = task.result.resource_id
-    resource = Resource.objects.get(pk=resource_id)
-    if _abort_needed(resource):
-        print("screenshot fetching aborted (late): %d" % resource_id)
-        return
+    _store_screenshot([task.result.resource_id], task.result.image)
 
-    result_fn = task.result.result_fn
-    print("screenshot fetched: %s" % result_fn)
 
-    resource_image = ResourceImage()
-    resource_image.image.save(
-        "screenshot_{}.png".format(resource.pk), File(open(result_fn, "rb"))
-    )
-    resource_image.save()
+def _store_screenshot(resource_ids, image):
+    resources = []
+    for resource in Resource.objects.filter(pk__in=resource_ids).order_by("id"):
+        if _abort_needed(resource):
+            print("screenshot fetching aborted (late): %d" % resource.id)
+            continue
+        resources.append(resource)
+    if len(resources) <= 0:
+        return
 
-    resource.image = resource_image
-    resource.screenshot_status = "DONE"
-    resource.save()
+    for resource in resources:
+        # own image for every resource with the same link (fetched once), as deleting the image deletes
+        # the resource too (saves ResourceImage too)
+        resource_image = ResourceImage()
+        resource_image.image.save(
+            "screenshot_{}.jpg".format(resource.pk), ContentFile(image)
+        )
+        print("screenshot fetched: %s" % resource_image.image.name)
 
-    result_dir = os.path.dirname(result_fn)
-    os.remove(result_fn)
-    os.rmdir(result_dir)
+        resource.image = resource_image
+        resource.screenshot_status = "DONE"
+        resource.save()
@@ -0,0 +1,119 @@
+import re
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+
+FTS_TABLE = "web_resource_fts"
+
+# searched fields, with weights used for ranking (see bm25() in https://www.sqlite.org/fts5.html)
+FTS_FIELDS = (
+    ("title", 10.0),
+    ("content", 1.0),
+    ("institution", 3.0),
+    ("city", 2.0),
+    ("country", 2.0),
+)
+
+_FTS_COLUMNS = ", ".join(name for (name, _) in FTS_FIELDS)
+_FTS_NEW_VALUES = ", ".join("new.%s" % name for (name, _) in FTS_FIELDS)
+_FTS_OLD_VALUES = ", ".join("old.%s" % name for (name, _) in FTS_FIELDS)
+
+# "external content" FTS5 table (e.g. text is NOT duplicated, only indexed), kept in sync by triggers
+FTS_INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        {_FTS_COLUMNS},
+        content='web_resource', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON web_resource BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON web_resource BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD_VALUES});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE ON web_resource BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_FTS_COLUMNS}) VALUES ('delete', old.id, {_FTS_OLD_VALUES});
+        INSERT INTO {FTS_TABLE}(rowid, {_FTS_COLUMNS}) VALUES (new.id, {_FTS_NEW_VALUES});
+    END""",
+    # index what is already there
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+FTS_UNINSTALL_SQL = [
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_au",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ad",
+    f"DROP TRIGGER IF EXISTS {FTS_TABLE}_ai",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def _fts_supported(db_connection):
+    return db_connection.vendor == "sqlite"
+
+
+def install_fts_index(db_connection=connection):
+    """Creates full-text index for resources (SQLite only, other DBs fall back to plain `icontains`)."""
+    if not _fts_supported(db_connection):
+        return
+    with db_connection.cursor() as cursor:
+        for sql in FTS_INSTALL_SQL:
+            cursor.execute(sql)
+
+
+def uninstall_fts_index(db_connection=connection):
+    if not _fts_supported(db_connection):
+        return
+    with db_connection.cursor() as cursor:
+        for sql in FTS_UNINSTALL_SQL:
+            cursor.execute(sql)
+
+
+def _get_search_terms(text):
+    return re.findall(r"\w+", text)
+
+
+def _get_fts_query(terms):
+    # every term quoted (=> user input can not break FTS query syntax), prefix match, all terms required
+    return " ".join('"%s"*' % term for term in terms)
+
+
+def search_resources(resource_list, text):
+    """
+    Narrows down given resources to those matching all the words in `text`, best matches first.
+
+    :param resource_list:   query set of resources to search in
+    :param text:            text entered by user
+    :return:                filtered and re-ordered `resource_list`
+    """
+    terms = _get_search_terms(text)
+    if len(terms) <= 0:
+        return resource_list
+
+    if not _fts_supported(connection):
+        for term in terms:
+            q = Q()
+            for (name, _) in FTS_FIELDS:
+                q |= Q(**{"%s__icontains" % name: term})
+            resource_list = resource_list.filter(q)
+        return resource_list
+
+    fts_query = _get_fts_query(terms)
+    weights = ", ".join(str(weight) for (_, weight) in FTS_FIELDS)
+    return (
+        resource_list.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+                [fts_query],
+            )
+        )
+        .annotate(
+            # bm25(): the lower, the better
+            search_rank=RawSQL(
+                f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE}"
+                f" WHERE {FTS_TABLE} MATCH %s AND rowid = web_resource.id",
+                [fts_query],
+            )
+        )
+        .order_by("search_rank", *resource_list.query.order_by)
+    )
@@ -0,0 +1,20 @@
+from constance.signals import config_updated
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .cache_utils import bump_resource_generation
+from .config_utils import clear_config_snapshot
+from .fragment_utils import evict_cards
+from .models import Resource
+
+
+@receiver(post_save, sender=Resource)
+@receiver(post_delete, sender=Resource)
+def resource_changed(sender, instance, **kwargs):
+    bump_resource_generation()
+    evict_cards(instance.id)
+
+
+@receiver(config_updated)
+def config_changed(sender, key, old_value, new_value, **kwargs):
+    clear_config_snapshot()
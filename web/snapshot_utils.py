@@ -0,0 +1,113 @@
+import time
+
+from django.core.files.storage import default_storage
+
+from .cache_utils import get_resource_generation
+from .models import ResourceDisplayMixin
+
+
+# see SCHEDULE_INDEX_TIMEOUT in schedule_utils.py
+EVENT_SNAPSHOT_TIMEOUT = 5 * 60
+
+# only what is needed for schedule.html and events.html
+EVENT_ROW_FIELDS = (
+    "id",
+    "modified",
+    "title",
+    "slug",
+    "year",
+    "event_time",
+    "form_language",
+    "country",
+    "city",
+    "institution",
+    "institution_is_oeg_member",
+    "image_url",
+    "user_image",
+    "user_image_thumbnail_hash",
+    "image__image",
+    "image__thumbnail_hash",
+)
+
+
+class EventRow(ResourceDisplayMixin):
+    """Lightweight read-only stand-in for `Resource` (event) in lists of events."""
+
+    __slots__ = tuple(f.replace("__", "_") for f in EVENT_ROW_FIELDS) + (
+        "event_day_number",
+        "favorite",
+    )
+
+    def __init__(self, values, event_day_number=None, favorite=None):
+        (
+            self.id,
+            self.modified,
+            self.title,
+            self.slug,
+            self.year,
+            self.event_time,
+            self.form_language,
+            self.country,
+            self.city,
+            self.institution,
+            self.institution_is_oeg_member,
+            self.image_url,
+            self.user_image,
+            self.user_image_thumbnail_hash,
+            self.image_image,
+            self.image_thumbnail_hash,
+        ) = values
+        self.event_day_number = event_day_number
+        self.favorite = favorite
+
+    @property
+    def pk(self):
+        return self.id
+
+    def get_image_url_for_detail(self):
+        """see Resource.get_image_url_for_detail()"""
+
+        u = self.image_url
+        if u is None and self.user_image:
+            u = default_storage.url(self.user_image)
+        if u is None and self.image_image:
+            u = default_storage.url(self.image_image)
+        return u
+
+    def get_local_image(self):
+        """see Resource.get_local_image()"""
+
+        if self.user_image:
+            return (self.user_image, self.user_image_thumbnail_hash)
+        if self.image_image:
+            return (self.image_image, self.image_thumbnail_hash)
+        return None
+
+
+# (generation, year, creation time, {<event ID>: <values of EVENT_ROW_FIELDS>, ...})
+_event_snapshot = (None, None, 0, {})
+
+
+def get_event_snapshot(year, event_list):
+    """
+    Returns values needed to render all events of given year, kept in memory of the process until some
+    resource is saved.
+
+    :param year:        year of the events in `event_list`
+    :param event_list:  (lazy) query set of all the events for `year`, evaluated only if snapshot is outdated
+    :return:            ordered dictionary <event ID>: <values for EventRow>
+    """
+    global _event_snapshot
+
+    generation = get_resource_generation()
+    (snapshot_generation, snapshot_year, created, rows) = _event_snapshot
+    if (
+        snapshot_generation != generation
+        or snapshot_year != year
+        or time.monotonic() - created > EVENT_SNAPSHOT_TIMEOUT
+    ):
+        rows = {
+            values[0]: values for values in event_list.values_list(*EVENT_ROW_FIELDS)
+        }
+        _event_snapshot = (generation, year, time.monotonic(), rows)
+    return rows
@@ -1,7 +1,14 @@
 from django import template
 
+from ..fragment_utils import get_card_key, get_or_render_card
+from ..timezone_utils import get_timezone_options_html
+
 register = template.Library()
 
+# paging (page, cursor) + filtering (see CommonResourceFilter and AssetFilter)
+PARAM_REPLACE_KEYS = {"page", "cursor", "q", "language", "year", "opentags"}
+
+
 # ref: https://www.caktusgroup.com/blog/2018/10/18/filtering-and-pagination-django/
 @register.simple_tag(takes_context=True)
 def param_replace(context, **kwargs):
@@ -24,13 +31,64 @@ def param_replace(context, **kwargs):
     Based on
     https://stackoverflow.com/questions/22734695/next-and-before-links-for-a-django-paginated-query/22735278#22735278
     """
-    # safety chec=k: limit amount of parameters to whatr we use: paging + filtering (year + opentags + language) = 4
-    if len(context["request"].GET) > 4:
-        raise ValueError("too many parameters")
-
+    # safety check: keep only parameters we use (paging + filtering), drop anything else
     d = context["request"].GET.copy()
+    for k in [k for k in d.keys() if k not in PARAM_REPLACE_KEYS]:
+        del d[k]
     for k, v in kwargs.items():
         d[k] = v
     for k in [k for k, v in d.items() if not v]:
         del d[k]
     return d.urlencode()
+
+
+@register.simple_tag
+def timezone_options(selected):
+    """<option> elements for all the timezones, see timezone_utils.get_timezone_options_html()"""
+    return get_timezone_options_html(str(selected))
+
+
+class CachedCardNode(template.Node):
+    def __init__(self, nodelist, name, resource, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.resource = resource
+        self.vary_on = vary_on
+
+    def render(self, context):
+        resource = self.resource.resolve(context)
+        vary_on = [v.resolve(context) for v in self.vary_on]
+        key = get_card_key(self.name, resource, vary_on)
+        return get_or_render_card(
+            key, resource.id, lambda: self.nodelist.render(context)
+        )
+
+
+@register.tag
+def cached_card(parser, token):
+    """
+    Caches rendered card of an event or resource, until the resource is saved, see fragment_utils.py .
+
+        {% cached_card "schedule" event event.favorite %}
+            ...
+        {% endcached_card %}
+
+    Card is re-rendered also for other timezone or other values of additional arguments, so everything
+    else used inside (except `resource`) has to be among those, e.g. no `forloop.counter` or `csrf_token`.
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(
+            "'%s' tag requires at least 2 arguments: name and resource" % bits[0]
+        )
+    nodelist = parser.parse(("endcached_card",))
+    parser.delete_first_token()
+    name = bits[1]
+    if name[0] in ('"', "'") and name[0] == name[-1]:
+        name = name[1:-1]
+    return CachedCardNode(
+        nodelist,
+        name,
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
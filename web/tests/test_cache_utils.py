@@ -0,0 +1,17 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+
+from web.cache_utils import bump_resource_generation, get_resource_generation
+
+
+def test_resource_generation_shared_among_processes():
+    generation = get_resource_generation()
+
+    # e.g. resource saved by django-q cluster or another web worker
+    process = multiprocessing.get_context("fork").Process(
+        target=bump_resource_generation
+    )
+    process.start()
+    process.join()
+
+    assert get_resource_generation() > generation
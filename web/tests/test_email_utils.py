@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+import smtplib
+
+import pytest
+
+from datetime import timedelta
+
+from django.core import mail
+from django.core.mail.backends import locmem
+from django.utils import timezone
+
+from web import email_utils
+from web.email_utils import (
+    EMAIL_MAX_ATTEMPTS,
+    EMAIL_MAX_RETRY_DELAY,
+    EMAIL_RETRY_DELAY,
+    MAILING_PRIORITY,
+    claim_queue_items,
+    get_queue_depth,
+    get_retry_delay,
+    get_send_email_batch_sizes,
+    queue_mailing,
+    send_email_task,
+)
+from web.models import EmailNotificationText, EmailQueueItem, Resource
+
+
+def __prepare_queue_item(i):
+    queue_item = EmailQueueItem(
+        subject="Test %d" % i, body="Body %d" % i, from_email="from@example.com"
+    )
+    queue_item.set_recipient_list(["to%d@example.com" % i])
+    queue_item.save()
+    return queue_item
+
+
+def test_send_email_batch_sizes(settings):
+    settings.EMAIL_QUEUE_RATE_LIMIT = 50
+    assert get_send_email_batch_sizes(0) == []
+    assert get_send_email_batch_sizes(5) == [5]
+    assert get_send_email_batch_sizes(21) == [11, 10]
+    assert get_send_email_batch_sizes(1000) == [17, 17, 16]
+
+
+@pytest.mark.django_db
+def test_send_email_task(settings, monkeypatch):
+    settings.EMAIL_QUEUE_RATE_LIMIT = 30
+    for i in range(45):
+        __prepare_queue_item(i)
+
+    connections = []
+    get_connection = email_utils.get_connection
+
+    def counting_get_connection():
+        connections.append(get_connection())
+        return connections[-1]
+
+    monkeypatch.setattr(email_utils, "get_connection", counting_get_connection)
+
+    send_email_task()
+    assert len(mail.outbox) == 30
+    assert len(connections) == 2
+    assert (
+        EmailQueueItem.objects.filter(status=EmailQueueItem.STATUS_SENT).count() == 30
+    )
+
+    send_email_task()
+    assert len(mail.outbox) == 45
+    assert [m.subject for m in mail.outbox] == ["Test %d" % i for i in range(45)]
+    assert not EmailQueueItem.objects.filter(
+        status=EmailQueueItem.STATUS_UNSENT
+    ).exists()
+
+
+@pytest.mark.django_db
+def test_send_email_task_smtp(settings):
+    aiosmtpd_controller = pytest.importorskip("aiosmtpd.controller")
+
+    received = []
+
+    class Handler:
+        async def handle_DATA(self, server, session, envelope):
+            if "refused@example.com" in envelope.rcpt_tos:
+                return "554 Transaction failed"
+            received.append(envelope)
+            return "250 OK"
+
+    controller = aiosmtpd_controller.Controller(Handler(), hostname="127.0.0.1")
+    controller.start()
+    try:
+        settings.EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+        settings.EMAIL_HOST = controller.hostname
+        settings.EMAIL_PORT = controller.port
+        settings.EMAIL_USE_TLS = False
+        for i in range(3):
+            __prepare_queue_item(i)
+        refused = __prepare_queue_item(3)
+        refused.set_recipient_list(["refused@example.com"])
+        refused.save()
+
+        send_email_task()
+    finally:
+        controller.stop()
+
+    assert len(received) == 3
+    assert list(EmailQueueItem.objects.filter(status=EmailQueueItem.STATUS_UNSENT)) == [
+        refused
+    ]
+
+
+@pytest.mark.django_db
+def test_claim_queue_items():
+    queue_items = [__prepare_queue_item(i) for i in range(5)]
+
+    first = claim_queue_items(3, "first")
+    second = claim_queue_items(3, "second")
+    assert first == queue_items[:3]
+    assert second == queue_items[3:]
+    assert claim_queue_items(3, "third") == []
+
+    # sender "first" died => its items are picked up once the lease expires
+    EmailQueueItem.objects.filter(worker_id="first").update(
+        lease_expires=timezone.now() - timedelta(seconds=1)
+    )
+    assert get_queue_depth() == 3
+    send_email_task()
+    assert [m.subject for m in mail.outbox] == ["Test 0", "Test 1", "Test 2"]
+    # items of "second" are still leased
+    assert get_queue_depth() == 0
+    assert EmailQueueItem.objects.filter(status=EmailQueueItem.STATUS_SENT).count() == 3
+
+
+class RefusingBackend(locmem.EmailBackend):
+    def send_messages(self, messages):
+        for message in messages:
+            if "refused@example.com" in message.to:
+                raise smtplib.SMTPRecipientsRefused({"refused@example.com": (550, "")})
+        return super().send_messages(messages)
+
+
+@pytest.mark.django_db
+def test_send_email_retries(monkeypatch):
+    monkeypatch.setattr(email_utils, "get_connection", RefusingBackend)
+    refused = __prepare_queue_item(0)
+    refused.set_recipient_list(["refused@example.com"])
+    refused.save()
+    __prepare_queue_item(1)
+
+    send_email_task()
+    refused.refresh_from_db()
+    assert [m.subject for m in mail.outbox] == ["Test 1"]
+    assert refused.status == EmailQueueItem.STATUS_UNSENT
+    assert refused.attempts == 1
+    assert refused.last_error
+    assert refused.next_attempt_at > timezone.now()
+    # waiting for retry
+    assert get_queue_depth() == 0
+
+    for attempt in range(2, EMAIL_MAX_ATTEMPTS + 1):
+        EmailQueueItem.objects.filter(id=refused.id).update(next_attempt_at=None)
+        send_email_task()
+    refused.refresh_from_db()
+    assert refused.status == EmailQueueItem.STATUS_FAILED
+    assert refused.attempts == EMAIL_MAX_ATTEMPTS
+    assert len(mail.outbox) == 1
+
+    assert get_retry_delay(1) == EMAIL_RETRY_DELAY
+    assert get_retry_delay(3) == 4 * EMAIL_RETRY_DELAY
+    assert get_retry_delay(100) == EMAIL_MAX_RETRY_DELAY
+
+
+@pytest.mark.django_db
+def test_queue_mailing():
+    template = EmailNotificationText.objects.create(
+        action=EmailNotificationText.ACTION_MAILING_CONTRIBUTORS,
+        subject="Thank you",
+        body="Dear {firstname}, thanks for {title}.",
+    )
+    Resource.objects.bulk_create(
+        [
+            Resource(title="First", firstname="Ann", email="Ann@example.com"),
+            Resource(title="Second", firstname="Ann", email="ann@example.com "),
+            Resource(title="Third", firstname="Bob", email="bob@example.com"),
+            Resource(title="Fourth", firstname="Nobody", email=""),
+        ]
+    )
+
+    assert queue_mailing(template, Resource.objects.all(), batch_size=1) == 2
+    queue_items = list(EmailQueueItem.objects.order_by("id"))
+    assert [q.get_recipient_list() for q in queue_items] == [
+        ["Ann@example.com"],
+        ["bob@example.com"],
+    ]
+    assert queue_items[0].body == "Dear Ann, thanks for First."
+    assert queue_items[0].priority == MAILING_PRIORITY
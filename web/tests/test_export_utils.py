@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import csv
+import io
+import json
+
+import pytest
+
+from django.conf import settings
+from django.urls import reverse
+from openpyxl import load_workbook
+
+from web.models import Resource
+
+
+def __prepare_resource(title, year, post_status, tags=""):
+    resource = Resource()
+    resource.title = title
+    resource.post_type = "event"
+    resource.post_status = post_status
+    resource.year = year
+    resource.slug = title.lower()
+    resource.opentags_csv = tags
+    resource.save()
+    return resource
+
+
+def __get_export(client, **params):
+    response = client.get(reverse("resource_export"), params)
+    assert response.status_code == 200
+    assert response.streaming
+    return b"".join(response.streaming_content)
+
+
+@pytest.mark.django_db
+def test_export_resources(admin_client):
+    __prepare_resource("First", settings.OEW_YEAR, "publish", "b,a")
+    __prepare_resource("Second", settings.OEW_YEAR - 1, "publish")
+    __prepare_resource("Draft", settings.OEW_YEAR, "draft")
+
+    rows = list(
+        csv.reader(io.StringIO(__get_export(admin_client, format="csv").decode()))
+    )
+    assert rows[0][0] == "ID"
+    assert [(row[2], row[6], row[14]) for row in rows[1:]] == [
+        ("First", "http://www.openeducationweek.org/events/first", "a, b")
+    ]
+
+    lines = __get_export(
+        admin_client, format="jsonl", year="all", status=["publish", "draft"]
+    ).splitlines()
+    assert sorted(json.loads(line)["title"] for line in lines) == [
+        "Draft",
+        "First",
+        "Second",
+    ]
+
+    wb = load_workbook(
+        io.BytesIO(__get_export(admin_client, year=settings.OEW_YEAR - 1))
+    )
+    assert [[c.value for c in row][2] for row in wb["Resources"].iter_rows()] == [
+        "Title",
+        "Second",
+    ]
+
+    response = admin_client.get(reverse("resource_export"), {"format": "xls"})
+    assert response.status_code == 400
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from django.conf import settings
+
+from web.facet_utils import get_library_facets
+from web.filters import AssetFilter
+from web.models import Resource
+from web.search_utils import install_fts_index
+
+
+def __prepare_resource(title, opentags_csv):
+    resource = Resource()
+    resource.title = title
+    resource.post_type = "resource"
+    resource.post_status = Resource.POST_STATUS_PUBLISH
+    resource.opentags_csv = opentags_csv
+    resource.save()
+    return resource
+
+
+@pytest.mark.django_db
+def test_asset_filter_opentags_exact_match():
+    course = __prepare_resource("course", "Open Course")
+    mooc = __prepare_resource("mooc", "Open Course (OCW / MOOC), Open Data")
+
+    f = AssetFilter({"opentags": "Open Course"}, queryset=Resource.objects.all())
+    assert list(f.qs) == [course]
+
+    f = AssetFilter(
+        {"opentags": "Open Course (OCW / MOOC)"}, queryset=Resource.objects.all()
+    )
+    assert list(f.qs) == [mooc]
+
+    # tags follow changes of opentags_csv, tags added otherwise (e.g. via admin) are kept
+    mooc.tags.add("Featured")
+    mooc.opentags_csv = "Open Data"
+    mooc.save()
+    f = AssetFilter(
+        {"opentags": "Open Course (OCW / MOOC)"}, queryset=Resource.objects.all()
+    )
+    assert list(f.qs) == []
+    assert set(mooc.tags.names()) == {"Open Data", "Featured"}
+
+
+@pytest.mark.django_db
+def test_asset_filter_facets():
+    __prepare_resource("course", "Open Course")
+    __prepare_resource("mooc", "Open Course (OCW / MOOC), Open Data")
+
+    facets = get_library_facets("resources", Resource.objects.all())
+    f = AssetFilter({}, queryset=Resource.objects.all(), facets=facets)
+    choices = dict(f.form.fields["opentags"].choices)
+    assert choices["Open Course"] == "Open Course (1)"
+    assert choices["Open Data"] == "Open Data (1)"
+    assert choices["Open Web"] == "Open Web (0)"
+    choices = dict(f.form.fields["year"].choices)
+    assert choices[settings.OEW_YEAR] == "%d (2)" % settings.OEW_YEAR
+
+
+@pytest.mark.django_db
+def test_asset_filter_search():
+    install_fts_index()
+
+    course = __prepare_resource("Open Course in Košice", "Open Course")
+    mooc = __prepare_resource("MOOC about courses", "Open Course (OCW / MOOC)")
+    __prepare_resource("Something else", "")
+
+    f = AssetFilter({"q": "course"}, queryset=Resource.objects.all())
+    # prefix match
+    assert set(f.qs) == {course, mooc}
+
+    f = AssetFilter({"q": 'kosice "open'}, queryset=Resource.objects.all())
+    assert list(f.qs) == [course]
+
+    # index follows changes
+    course.title = "Renamed"
+    course.save()
+    f = AssetFilter({"q": "kosice"}, queryset=Resource.objects.all())
+    assert list(f.qs) == []
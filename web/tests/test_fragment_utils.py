@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from django.template import Context, Template
+
+from web.fragment_utils import get_card_cache_stats
+from web.models import Resource
+
+
+CARD_TEMPLATE = Template(
+    "{% load web_extras %}"
+    "{% for resource in resource_list %}"
+    '{% cached_card "test" resource favorite %}{{ resource.title }}:{{ favorite }}{% endcached_card %}'
+    "{% endfor %}"
+)
+
+
+def __render(resource, favorite=None):
+    return CARD_TEMPLATE.render(
+        Context({"resource_list": [resource], "favorite": favorite})
+    )
+
+
+@pytest.mark.django_db
+def test_cached_card():
+    resource = Resource(title="Old title", post_type="resource")
+    resource.save()
+
+    stats = get_card_cache_stats()
+    assert __render(resource) == "Old title:None"
+    assert __render(resource) == "Old title:None"
+    assert __render(resource, True) == "Old title:True"
+    after = get_card_cache_stats()
+    assert after["misses"] - stats["misses"] == 2
+    assert after["hits"] - stats["hits"] == 1
+
+    # cached HTML is used as long as resource is not saved
+    resource.title = "New title"
+    assert __render(resource) == "Old title:None"
+    resource.save()
+    assert __render(resource) == "New title:None"
+    assert __render(Resource.objects.get(id=resource.id), True) == "New title:True"
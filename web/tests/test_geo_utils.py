@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import pickle
+
+import pytest
+
+from web.geo_utils import get_geo_index, normalize_name
+from web.models import Resource
+from web.utils import get_gc_city_entry, guess_locations
+
+
+def test_normalize_name():
+    assert normalize_name(" Košice ") == "kosice"
+    assert normalize_name("SÃO  Paulo") == "sao paulo"
+
+
+def test_geo_index():
+    index = get_geo_index()
+    assert [c["countrycode"] for c in index.search_cities("Košice")] == ["SK"]
+    assert index.search_cities("KOSICE") == index.search_cities("Košice")
+    assert len(index.search_cities("Paris")) > 1
+    assert index.search_cities("Dummy City") == []
+
+    copy = pickle.loads(pickle.dumps(index))
+    assert copy.search_cities("kosice") == index.search_cities("kosice")
+
+    # no city => capital
+    assert get_gc_city_entry("Slovakia", "")["name"] == "Bratislava"
+
+
+@pytest.mark.django_db
+def test_guess_locations():
+    for (city, country) in (
+        ("kosice", None),
+        ("kosice", None),
+        ("Dummy City", None),
+        ("", ""),
+    ):
+        Resource.objects.create(city=city, country=country)
+
+    assert guess_locations(Resource.objects.all(), batch_size=1) == 2
+    assert list(Resource.objects.order_by("id").values_list("lat", flat=True)) == [
+        48.71395,
+        48.71395,
+        None,
+        None,
+    ]
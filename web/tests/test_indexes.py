@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import pytest
+import uuid
+
+from django.conf import settings
+from django.db import connection
+
+from web import views
+from web.models import Resource
+
+
+pytestmark = pytest.mark.skipif(
+    connection.vendor != "sqlite", reason="checks SQLite's EXPLAIN QUERY PLAN"
+)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "get_queryset,index_name",
+    [
+        (
+            lambda: views._get_events_query_set(year=settings.OEW_YEAR),
+            "web_resource_schedule_idx",
+        ),
+        (
+            lambda: views._get_events_query_set(
+                ordering=views.ResourceOrdering.LIBRARY
+            ),
+            "web_resource_library_idx",
+        ),
+        (
+            lambda: views._resources_query_set(ordering=views.ResourceOrdering.LIBRARY),
+            "web_resource_library_idx",
+        ),
+        (
+            lambda: Resource.objects.filter(
+                year=settings.OEW_YEAR, slug="some-event", post_type="event"
+            ),
+            "web_resource_slug_idx",
+        ),
+        (
+            lambda: Resource.objects.filter(
+                slug="some-event", post_type="event", post_status="publish"
+            ).order_by("year"),
+            "web_resource_slug_idx",
+        ),
+        (
+            lambda: Resource.objects.filter(uuid=uuid.uuid4()),
+            "web_resource_uuid_idx",
+        ),
+    ],
+)
+def test_query_uses_index(get_queryset, index_name):
+    plan = get_queryset().explain()
+    assert index_name in plan, plan
+    # ordering should be satisfied by index too (at least its first part)
+    assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import re
+
+import pytest
+
+from django.test import Client
+
+from web.models import Resource
+from web.page_cache_utils import CSRF_TOKEN_PLACEHOLDER
+
+
+def __prepare_resource(title):
+    resource = Resource()
+    resource.title = title
+    resource.post_type = "resource"
+    resource.post_status = Resource.POST_STATUS_PUBLISH
+    resource.save()
+    return resource
+
+
+@pytest.mark.django_db
+def test_anonymous_page_cache(client):
+    resource = __prepare_resource("Old title")
+
+    response = client.get("/resources/")
+    assert response.status_code == 200
+    assert CSRF_TOKEN_PLACEHOLDER not in response.content.decode()
+    etag = response["ETag"]
+    assert response["Last-Modified"]
+
+    # same page => same ETag, even though CSRF token differs
+    response = client.get("/resources/")
+    assert response["ETag"] == etag
+    assert CSRF_TOKEN_PLACEHOLDER not in response.content.decode()
+    response = client.get("/resources/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+
+    # changed resources => new page
+    resource.title = "New title"
+    resource.save()
+    response = client.get("/resources/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert "New title" in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_anonymous_page_cache_per_session(client):
+    __prepare_resource("Some title")
+
+    etag = client.get("/resources/")["ETag"]
+    session = client.session
+    session["django_timezone"] = "Europe/Bratislava"
+    session.save()
+    response = client.get("/resources/", HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_page_cache_skipped_for_users(client, admin_user):
+    __prepare_resource("Some title")
+
+    client.force_login(admin_user)
+    response = client.get("/resources/")
+    assert response.status_code == 200
+    assert "ETag" not in response
+    assert CSRF_TOKEN_PLACEHOLDER not in response.content.decode()
+
+
+@pytest.mark.django_db
+def test_page_cache_csrf_token_valid():
+    __prepare_resource("Some title")
+    Client().get("/resources/")  # someone else's visit => page cached
+
+    client = Client(enforce_csrf_checks=True)
+    content = client.get("/resources/").content.decode()
+    token = re.search(r'"X-CSRFToken", "(\w+)"', content).group(1)
+    response = client.post(
+        "/set-timezone/", {"timezone": "Europe/Bratislava"}, HTTP_X_CSRFTOKEN=token
+    )
+    assert response.status_code == 200
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from django.db.models.functions import Lower
+
+from web.models import Resource
+from web.pagination_utils import paginate_keyset
+
+
+def __prepare_resources():
+    for (title, year) in (("b", 2022), ("A", 2022), ("c", 2022), ("a", 2021)):
+        resource = Resource()
+        resource.title = title
+        resource.year = year
+        resource.post_type = "resource"
+        resource.post_status = Resource.POST_STATUS_PUBLISH
+        resource.save()
+    return Resource.objects.annotate(lower_title=Lower("title")).order_by(
+        "-year", "lower_title", "id"
+    )
+
+
+@pytest.mark.django_db
+def test_paginate_keyset():
+    resource_list = __prepare_resources()
+    expected = [(r.year, r.title) for r in resource_list]
+    assert expected == [(2022, "A"), (2022, "b"), (2022, "c"), (2021, "a")]
+
+    page1 = paginate_keyset(resource_list, None, 3)
+    assert [(r.year, r.title) for r in page1] == expected[:3]
+    assert page1.has_next and not page1.has_previous
+
+    page2 = paginate_keyset(resource_list, page1.next_cursor, 3)
+    assert [(r.year, r.title) for r in page2] == expected[3:]
+    assert page2.has_previous and not page2.has_next
+
+    # going back gives the same page as before
+    back = paginate_keyset(resource_list, page2.previous_cursor, 3)
+    assert [(r.year, r.title) for r in back] == expected[:3]
+    assert back.has_next and not back.has_previous
+
+    page = paginate_keyset(resource_list, None, 2)
+    page = paginate_keyset(resource_list, page.next_cursor, 2)
+    page = paginate_keyset(resource_list, page.previous_cursor, 2)
+    assert [(r.year, r.title) for r in page] == expected[:2]
+    assert page.has_next and not page.has_previous
+
+
+@pytest.mark.django_db
+def test_paginate_keyset_invalid_cursor():
+    resource_list = __prepare_resources()
+    with pytest.raises(ValueError):
+        paginate_keyset(resource_list, "not-a-cursor", 3)
+    with pytest.raises(ValueError):
+        paginate_keyset(Resource.objects.order_by("title"), None, 3)
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+import arrow
+import pytest
+import pytz
+
+from django.conf import settings
+
+from web import schedule_utils
+from web.models import Resource
+from web.schedule_utils import (
+    ScheduleTable,
+    _build_schedule_index,
+    get_event_day_number,
+    get_oe_week_calendar,
+    get_oe_week_range,
+    get_schedule_index,
+)
+
+
+def __prepare_event(title, event_time):
+    resource = Resource()
+    resource.title = title
+    resource.post_type = "event"
+    resource.post_status = Resource.POST_STATUS_PUBLISH
+    resource.year = settings.OEW_YEAR
+    resource.event_source_timezone = "UTC"
+    resource.event_time = arrow.get(event_time).datetime
+    resource.save()
+    return resource
+
+
+def __get_event_list():
+    return Resource.objects.filter(
+        post_type="event", post_status="publish", year=settings.OEW_YEAR
+    ).order_by("event_time")
+
+
+@pytest.mark.django_db
+def test_schedule_index_per_timezone():
+    # Monday of OE Week, late evening in UTC => already Tuesday in Tokyo
+    event = __prepare_event("late", settings.OEW_RANGE[0][:10] + "T22:00:00+00:00")
+    other = __prepare_event("other", "2000-01-01T12:00:00+00:00")
+
+    index = get_schedule_index(settings.OEW_YEAR, pytz.utc, __get_event_list())
+    assert index["1"] == [event.id]
+    assert index["other"] == [other.id]
+
+    index = get_schedule_index(
+        settings.OEW_YEAR, pytz.timezone("Asia/Tokyo"), __get_event_list()
+    )
+    assert index["1"] == []
+    assert index["2"] == [event.id]
+
+
+@pytest.mark.django_db
+def test_schedule_index_invalidated_on_save():
+    event = __prepare_event("first", settings.OEW_RANGE[0][:10] + "T12:00:00+00:00")
+    index = get_schedule_index(settings.OEW_YEAR, pytz.utc, __get_event_list())
+    assert index["1"] == [event.id]
+
+    event.post_status = Resource.POST_STATUS_TRASH
+    event.save()
+    index = get_schedule_index(settings.OEW_YEAR, pytz.utc, __get_event_list())
+    assert index["1"] == []
+
+
+def test_oe_week_calendar_matches_per_event_conversion():
+    start = arrow.get(settings.OEW_RANGE[0]).shift(days=-2)
+    event_times = [start.shift(minutes=37 * i).datetime for i in range(500)]
+    for tzname in ("UTC", "Asia/Tokyo", "America/Los_Angeles", "Pacific/Chatham"):
+        tz = pytz.timezone(tzname)
+        calendar = get_oe_week_calendar(tz)
+        assert calendar is get_oe_week_calendar(tz)
+        oew_range = get_oe_week_range(tz)
+        for event_time in event_times:
+            assert calendar.get_day_number(event_time) == get_event_day_number(
+                event_time, tz, oew_range
+            )
+
+
+@pytest.mark.django_db
+def test_schedule_table_matches_index_per_timezone():
+    start = arrow.get(settings.OEW_RANGE[0]).shift(days=-2)
+    for i in range(60):
+        # several events in the same time => order from query set must be kept
+        __prepare_event("event %02d" % i, start.shift(hours=3 * (i // 2)).isoformat())
+
+    timezones = ("UTC", "Asia/Tokyo", "America/Los_Angeles", "Pacific/Chatham")
+    table = ScheduleTable(__get_event_list().order_by("event_time", "title"), timezones)
+    for tzname in timezones:
+        assert table.get_index(tzname) == _build_schedule_index(
+            __get_event_list().order_by("event_time", "title"), pytz.timezone(tzname)
+        )
+    assert table.get_index("US/Pacific") is None
+
+
+@pytest.mark.django_db
+def test_schedule_table_read_once_per_timezone(monkeypatch):
+    __prepare_event("first", settings.OEW_RANGE[0][:10] + "T12:00:00+00:00")
+    get_schedule_index(settings.OEW_YEAR, pytz.utc, __get_event_list())
+
+    def fail(*args):
+        raise AssertionError("table read while index is cached")
+
+    monkeypatch.setattr(schedule_utils, "get_schedule_table", fail)
+    index = get_schedule_index(settings.OEW_YEAR, pytz.utc, __get_event_list())
+    assert len(index["1"]) == 1
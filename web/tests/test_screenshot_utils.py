@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import pytest
+
+from web import screenshot_utils
+from web.models import Resource
+from web.screenshot_utils import (
+    FetchScreenshotTimeout,
+    Screenshot,
+    ScreenshotWorkerPool,
+    _store_screenshot,
+    get_screenshot_queue,
+    get_screenshot_queue_status,
+)
+
+
+class FakeScreenshot:
+    def capture(self, url):
+        if url == "crash":
+            os._exit(1)
+        if url == "hang":
+            time.sleep(60)
+        start = time.monotonic()
+        if url.startswith("http"):
+            time.sleep(0.2)
+        return (("%s %f %f" % (url, start, time.monotonic())).encode("ascii"), 0.1)
+
+
+def test_screenshot_worker_pool(monkeypatch):
+    # workers are forked => they get fake "browser" too
+    monkeypatch.setattr(screenshot_utils, "_get_screenshot", FakeScreenshot)
+
+    jobs = list(enumerate(["a", "crash", "b", "hang", "c", "d"]))
+    results = list(ScreenshotWorkerPool(2, job_timeout=2).run(jobs))
+
+    assert len(results) == len(jobs)
+    failed = set(r.resource_id for r in results if r.exception is not None)
+    assert failed == {1, 3}
+    for result in results:
+        if result.exception is None:
+            assert result.image.split()[0].decode() == jobs[result.resource_id][1]
+            assert result.load_time == 0.1
+        else:
+            assert result.image is None
+            assert result.load_time is None
+
+
+def test_screenshot_worker_pool_max_per_host(monkeypatch):
+    monkeypatch.setattr(screenshot_utils, "_get_screenshot", FakeScreenshot)
+
+    urls = ["http://a.org/1", "http://a.org/2", "http://b.org/1", "http://a.org/3"]
+    jobs = list(enumerate(urls))
+    results = list(ScreenshotWorkerPool(3, max_per_host=1).run(jobs))
+
+    intervals = []
+    for result in results:
+        (url, start, end) = result.image.decode().split()
+        if url.startswith("http://a.org"):
+            intervals.append((float(start), float(end)))
+    intervals.sort()
+    assert len(intervals) == 3
+    for (previous, following) in zip(intervals, intervals[1:]):
+        assert previous[1] <= following[0]
+
+
+def __prepare_view(monkeypatch):
+    """stub of Screenshot (just what wait_load() needs), QtWebKit and display are not needed"""
+    QtCore = pytest.importorskip("PyQt5.QtCore")
+    # not imported by screenshot_utils for front-end deployment
+    monkeypatch.setattr(
+        screenshot_utils, "QEventLoop", QtCore.QEventLoop, raising=False
+    )
+    monkeypatch.setattr(screenshot_utils, "QTimer", QtCore.QTimer, raising=False)
+
+    class StubView(QtCore.QObject):
+        loadFinished = QtCore.pyqtSignal(bool)
+        MAX_LOAD_TIME = 300
+
+        def __init__(self):
+            super().__init__()
+            self.app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+            self._loaded = False
+            self.stopped = False
+            self.loadFinished.connect(self._loadFinished)
+
+        def _loadFinished(self, result):
+            self._loaded = True
+
+        def stop(self):
+            self.stopped = True
+
+        def url(self):
+            return QtCore.QUrl("https://slow.example.org/")
+
+    return (QtCore, StubView())
+
+
+def test_wait_load_timeout(monkeypatch, caplog):
+    (_, view) = __prepare_view(monkeypatch)
+
+    start = time.monotonic()
+    with pytest.raises(FetchScreenshotTimeout):
+        Screenshot.wait_load(view)
+    # wall-clock deadline (Qt timers are coarse, may fire up to 5 % earlier)
+    assert 0.25 <= time.monotonic() - start < 2
+    assert view.stopped
+    assert not view._loaded
+    assert "loading aborted" in caplog.text
+
+
+def test_wait_load_loaded(monkeypatch):
+    (QtCore, view) = __prepare_view(monkeypatch)
+
+    QtCore.QTimer.singleShot(50, lambda: view.loadFinished.emit(True))
+    load_time = Screenshot.wait_load(view)
+    assert 0.04 <= load_time < 0.3
+    assert not view.stopped
+    # ready for next load
+    assert not view._loaded
+
+
+def __prepare_resource(link, post_status):
+    resource = Resource()
+    resource.title = link
+    resource.link = link
+    resource.post_status = post_status
+    resource.save()
+    return resource
+
+
+@pytest.mark.django_db
+def test_screenshot_queue():
+    draft = __prepare_resource("https://a.org/", Resource.POST_STATUS_DRAFT)
+    published = __prepare_resource("https://b.org/", Resource.POST_STATUS_PUBLISH)
+    duplicate = __prepare_resource(" https://a.org/", Resource.POST_STATUS_DRAFT)
+    __prepare_resource("", Resource.POST_STATUS_PUBLISH)
+
+    queue = get_screenshot_queue(Resource.objects.all())
+    assert [(url, [r.id for r in group]) for (url, group) in queue] == [
+        ("https://b.org/", [published.id]),
+        ("https://a.org/", [draft.id, duplicate.id]),
+    ]
+
+    status = get_screenshot_queue_status(
+        queue, workers=4, max_per_host=2, capture_time=5
+    )
+    assert status == {"resources": 3, "urls": 2, "hosts": 2, "eta": 5}
+
+
+@pytest.mark.django_db
+def test_store_screenshot(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    first = __prepare_resource("https://a.org/", Resource.POST_STATUS_DRAFT)
+    second = __prepare_resource("https://a.org/", Resource.POST_STATUS_DRAFT)
+
+    _store_screenshot([first.id, second.id], b"image data")
+
+    first.refresh_from_db()
+    second.refresh_from_db()
+    assert first.screenshot_status == "DONE"
+    # not shared: deleting the image of one resource must not delete the other one
+    assert first.image_id != second.image_id
+    first.image.delete()
+    assert Resource.objects.filter(pk=second.pk).exists()
+    with second.image.image.open() as f:
+        assert f.read() == b"image data"
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from django.conf import settings
+from django.contrib.sessions.backends.db import SessionStore
+from django.test import RequestFactory
+
+from web import views
+from web.models import Resource
+from web.snapshot_utils import EventRow, get_event_snapshot
+
+
+def __get_event_list():
+    return Resource.objects.filter(
+        post_type="event", post_status="publish", year=settings.OEW_YEAR
+    ).order_by("event_time")
+
+
+@pytest.mark.django_db
+def test_event_snapshot_follows_saves():
+    resource = Resource(
+        title="Old title",
+        post_type="event",
+        post_status=Resource.POST_STATUS_PUBLISH,
+        image_url="https://archive.org/image.png",
+    )
+    resource.save()
+
+    event = EventRow(
+        get_event_snapshot(settings.OEW_YEAR, __get_event_list())[resource.id]
+    )
+    assert event.title == "Old title"
+    assert event.consolidated_image_url_list == "https://archive.org/image-sm.png"
+    assert not hasattr(event, "__dict__")
+
+    resource.title = "New title"
+    resource.save()
+    event = EventRow(
+        get_event_snapshot(settings.OEW_YEAR, __get_event_list())[resource.id]
+    )
+    assert event.title == "New title"
+
+
+@pytest.mark.django_db
+def test_events_list_count_matches_rows(monkeypatch):
+    events = []
+    for title in ("first", "second"):
+        resource = Resource(
+            title=title,
+            post_type="event",
+            post_status=Resource.POST_STATUS_PUBLISH,
+            year=settings.OEW_YEAR,
+            event_time=settings.OEW_RANGE[0][:10] + "T12:00:00+00:00",
+        )
+        resource.save()
+        events.append(resource)
+
+    # snapshot built after the second event was (say) trashed, index before that
+    snapshot = dict(get_event_snapshot(settings.OEW_YEAR, __get_event_list()))
+    del snapshot[events[1].id]
+    monkeypatch.setattr(views, "get_event_snapshot", lambda year, event_list: snapshot)
+
+    request = RequestFactory().get("/")
+    request.session = SessionStore()
+    (days_with_events, event_count) = views._get_events_list(request)
+    assert [[e.id for e in day[3]] for day in days_with_events] == [[events[0].id]]
+    assert event_count == 1
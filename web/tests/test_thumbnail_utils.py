@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from io import BytesIO
+
+import pytest
+
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template import Context, Template
+from PIL import Image
+
+from web.models import Resource, ResourceImage
+from web.snapshot_utils import EVENT_ROW_FIELDS, EventRow
+from web.thumbnail_utils import get_thumbnail_name
+
+
+def __prepare_image(name="test.png", size=(2000, 1000)):
+    buffer = BytesIO()
+    Image.new("RGBA", size, (255, 0, 0, 128)).save(buffer, "PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@pytest.mark.django_db
+def test_user_image_thumbnails(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    resource = Resource(
+        title="With image", post_type="resource", user_image=__prepare_image()
+    )
+    resource.save()
+
+    thumbnail_hash = resource.user_image_thumbnail_hash
+    assert thumbnail_hash
+    for size, expected in (
+        ("list", (480, 240, "WEBP")),
+        ("detail", (1024, 512, "WEBP")),
+        ("social", (1200, 630, "JPEG")),
+    ):
+        with default_storage.open(get_thumbnail_name(thumbnail_hash, size)) as f:
+            image = Image.open(f)
+            assert (image.width, image.height, image.format) == expected
+
+    assert resource.consolidated_image_url_list.endswith(
+        get_thumbnail_name(thumbnail_hash, "list")
+    )
+    assert resource.consolidated_image_url_detail.endswith(
+        get_thumbnail_name(thumbnail_hash, "detail")
+    )
+    row = EventRow(
+        Resource.objects.filter(id=resource.id).values_list(*EVENT_ROW_FIELDS)[0]
+    )
+    assert row.consolidated_image_url_social == resource.consolidated_image_url_social
+
+    # unchanged image is not processed again, removed one has no thumbnails
+    resource.title = "Still with image"
+    resource.save()
+    assert resource.user_image_thumbnail_hash == thumbnail_hash
+    resource.user_image = None
+    resource.save()
+    assert resource.user_image_thumbnail_hash == ""
+    assert resource.consolidated_image_url_list is None
+
+
+@pytest.mark.django_db
+def test_broken_image(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    resource = Resource(
+        title="Broken image",
+        post_type="resource",
+        user_image=SimpleUploadedFile("broken.png", b"not an image"),
+    )
+    resource.save()
+
+    # falls back to the original
+    assert resource.user_image_thumbnail_hash == ""
+    assert resource.consolidated_image_url_list == resource.user_image.url
+
+
+CARD_TEMPLATE = Template(
+    "{% load web_extras %}"
+    '{% cached_card "test" resource %}{{ resource.consolidated_image_url_list }}{% endcached_card %}'
+)
+
+
+@pytest.mark.django_db
+def test_generate_thumbnails_command_evicts_cards(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    resource = Resource(
+        title="With image", post_type="resource", user_image=__prepare_image()
+    )
+    resource.save()
+    image = ResourceImage(image=__prepare_image("screenshot.png"))
+    image.save()
+    screenshot = Resource(title="With screenshot", post_type="resource", image=image)
+    screenshot.save()
+    # stored before thumbnails existed
+    Resource.objects.filter(id=resource.id).update(user_image_thumbnail_hash="")
+    ResourceImage.objects.filter(id=image.id).update(thumbnail_hash="")
+
+    for item in (resource, screenshot):
+        item = Resource.objects.get(id=item.id)
+        assert "thumbnails/" not in CARD_TEMPLATE.render(Context({"resource": item}))
+
+    call_command("generate_thumbnails")
+
+    for item in (resource, screenshot):
+        item = Resource.objects.get(id=item.id)
+        html = CARD_TEMPLATE.render(Context({"resource": item}))
+        assert html == item.consolidated_image_url_list
+        assert "thumbnails/" in html
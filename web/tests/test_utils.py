@@ -1,13 +1,29 @@
 # -*- coding: utf-8 -*-
 
+import multiprocessing
+
 import pytest
 
+from constance import config
+
+from web.config_utils import get_config_snapshot
 from web.models import Resource
-from web.utils import guess_missing_location
+from web.timezone_utils import (
+    get_timezone_from_accept_language,
+    get_timezone_options_html,
+)
+from web import utils
+from web.utils import (
+    guess_missing_activity_fields_async,
+    guess_missing_location,
+    guess_pending_locations,
+    guess_timezones,
+)
 
 
-def __prepare_resource(country=None, city=None):
+def __prepare_resource(country=None, city=None, post_type="event"):
     resource = Resource()
+    resource.post_type = post_type
     resource.country = country
     resource.city = city
     resource.save()
@@ -44,3 +60,155 @@ def test_guess_missing_activity_fields_location():
     resource = __get_resource(resource_id)
     assert resource.lat is None
     assert resource.lng is None
+
+
+@pytest.mark.django_db
+def test_guess_pending_locations(django_assert_max_num_queries):
+    ids = [__prepare_resource(city="kosice") for _ in range(3)]
+    ids.append(__prepare_resource(city="Dummy City"))
+    for id in ids:
+        guess_missing_activity_fields_async(__get_resource(id))
+    assert Resource.objects.filter(location_pending=True).count() == 4
+
+    # one pass for all of them, not a task (and save) per resource
+    with django_assert_max_num_queries(8):
+        assert guess_pending_locations() == 3
+
+    resource = __get_resource(ids[0])
+    assert (resource.lat, resource.lng) == (48.71395, 21.25808)
+    assert resource.event_source_timezone == "Europe/Bratislava"
+    assert resource.event_source_timezone_guessed
+    assert not Resource.objects.filter(location_pending=True).exists()
+
+
+@pytest.mark.django_db
+def test_guess_pending_locations_keeps_resources_saved_meanwhile(monkeypatch):
+    ids = [__prepare_resource(city="kosice") for _ in range(2)]
+    Resource.objects.filter(id__in=ids).update(location_pending=True)
+
+    get_gc_city_entry = utils.get_gc_city_entry
+
+    def get_gc_city_entry_and_save(country, city):
+        # submitter changes the city while the pass is running
+        resource = __get_resource(ids[1])
+        resource.city = "Paris"
+        resource.save()
+        Resource.objects.filter(pk=resource.pk).update(location_pending=True)
+        return get_gc_city_entry(country, city)
+
+    monkeypatch.setattr(utils, "get_gc_city_entry", get_gc_city_entry_and_save)
+    guess_pending_locations()
+
+    resource = __get_resource(ids[0])
+    assert (resource.lat, resource.lng) == (48.71395, 21.25808)
+    assert not resource.location_pending
+    resource = __get_resource(ids[1])
+    assert (resource.lat, resource.lng) == (None, None)
+    assert resource.location_pending
+
+
+@pytest.mark.django_db
+def test_guess_pending_locations_queued_once(monkeypatch, settings):
+    settings.FE_DEPLOYMENT = False
+    queued = []
+    monkeypatch.setattr(utils, "async_task", queued.append, raising=False)
+    monkeypatch.setattr(utils, "LOCATION_BACKLOG_THRESHOLD", 2)
+
+    # left by some previous run
+    utils._location_pass_started()
+
+    ids = [__prepare_resource(city="kosice") for _ in range(4)]
+    for id in ids:
+        guess_missing_activity_fields_async(__get_resource(id))
+    assert queued == [guess_pending_locations]
+
+    # pass started (by django-q cluster, another process) => resources marked from now on need another one
+    process = multiprocessing.get_context("fork").Process(
+        target=utils._location_pass_started
+    )
+    process.start()
+    process.join()
+    for id in ids[:2]:
+        guess_missing_activity_fields_async(__get_resource(id))
+    assert queued == [guess_pending_locations, guess_pending_locations]
+    guess_pending_locations()
+
+
+@pytest.mark.django_db
+def test_guess_timezones():
+    ids = [
+        __prepare_resource(city="kosice"),
+        # unknown city => capital
+        __prepare_resource(city="Dummy City", country="Slovakia"),
+        __prepare_resource(city="Dummy City"),
+        # not an event => no use for timezone
+        __prepare_resource(city="kosice", post_type="resource"),
+    ]
+    assert guess_timezones(Resource.objects.all()) == 2
+    assert [__get_resource(id).event_source_timezone for id in ids] == [
+        "Europe/Bratislava",
+        "Europe/Bratislava",
+        "",
+        "",
+    ]
+    assert __get_resource(ids[0]).event_source_timezone_guessed
+
+    # entered by submitter => no longer guessed
+    resource = __get_resource(ids[0])
+    resource.event_source_timezone = "Europe/Vienna"
+    resource.save()
+    assert not __get_resource(ids[0]).event_source_timezone_guessed
+
+
+def test_get_timezone_from_accept_language():
+    assert get_timezone_from_accept_language("sk-SK,sk;q=0.9,en;q=0.8") == (
+        "Europe/Bratislava"
+    )
+    assert get_timezone_from_accept_language("en;q=0.8,de-AT") == "Europe/Vienna"
+    assert get_timezone_from_accept_language("es-419,es") is None
+    assert get_timezone_from_accept_language("") is None
+
+
+@pytest.mark.django_db
+def test_config_snapshot_follows_config_changes():
+    config.HIDE_RESOURCE_BUTTONS_IN_BASE_TEMPLACE = False
+    assert get_config_snapshot().hide_resource_buttons is False
+
+    # snapshot is cleared on change
+    config.HIDE_RESOURCE_BUTTONS_IN_BASE_TEMPLACE = True
+    assert get_config_snapshot().hide_resource_buttons is True
+    config.HIDE_RESOURCE_BUTTONS_IN_BASE_TEMPLACE = False
+
+
+def test_timezone_options_html():
+    html = get_timezone_options_html("Europe/Bratislava")
+    assert (
+        '<option value="Europe/Bratislava" selected>Europe/Bratislava</option>' in html
+    )
+    assert '<option value="Europe/Prague">Europe/Prague</option>' in html
+
+
+@pytest.mark.django_db
+def test_guess_timezones_keeps_timezone_entered_meanwhile(monkeypatch):
+    ids = [__prepare_resource(city="kosice") for _ in range(2)]
+
+    get_timezone_for_location = utils.get_timezone_for_location
+
+    def get_timezone_for_location_and_save(country, city):
+        # submitter enters the timezone while timezones are being guessed
+        resource = __get_resource(ids[1])
+        resource.event_source_timezone = "Europe/Vienna"
+        resource.save()
+        return get_timezone_for_location(country, city)
+
+    monkeypatch.setattr(
+        utils, "get_timezone_for_location", get_timezone_for_location_and_save
+    )
+    guess_timezones(Resource.objects.all())
+
+    resource = __get_resource(ids[0])
+    assert resource.event_source_timezone == "Europe/Bratislava"
+    assert resource.event_source_timezone_guessed
+    resource = __get_resource(ids[1])
+    assert resource.event_source_timezone == "Europe/Vienna"
+    assert not resource.event_source_timezone_guessed
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from web.templatetags.web_extras import param_replace
+
+
+def test_param_replace_all_filters_and_paging():
+    request = RequestFactory().get(
+        "/resources/",
+        {
+            "q": "open",
+            "language": "en",
+            "year": "2022",
+            "opentags": "Open Data",
+            "page": "2",
+            "cursor": "abc",
+            "utm_source": "newsletter",
+        },
+    )
+
+    params = QueryDict(param_replace({"request": request}, cursor="def", page=""))
+    assert params.dict() == {
+        "q": "open",
+        "language": "en",
+        "year": "2022",
+        "opentags": "Open Data",
+        "cursor": "def",
+    }
@@ -0,0 +1,97 @@
+import hashlib
+
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+THUMBNAIL_DIR = "thumbnails"
+
+# <size name>: (<max. width>, <max. height>, <format>, <crop to exact size?>)
+THUMBNAIL_SIZES = {
+    # library/schedule cards
+    "list": (480, 360, "WEBP", False),
+    # detail pages
+    "detail": (1024, 768, "WEBP", False),
+    # og:image (not all the social networks support WebP)
+    "social": (1200, 630, "JPEG", True),
+}
+
+THUMBNAIL_EXTENSIONS = {
+    "WEBP": "webp",
+    "JPEG": "jpg",
+}
+
+THUMBNAIL_QUALITY = 80
+
+
+def get_thumbnail_name(image_hash, size):
+    """
+    :param image_hash:  as returned by generate_thumbnails()
+    :param size:        one of the THUMBNAIL_SIZES
+    :return:            name of the thumbnail in default storage
+    """
+    image_format = THUMBNAIL_SIZES[size][2]
+    return "%s/%s-%s.%s" % (
+        THUMBNAIL_DIR,
+        image_hash,
+        size,
+        THUMBNAIL_EXTENSIONS[image_format],
+    )
+
+
+def _render_thumbnail(source, size):
+    (width, height, image_format, crop) = THUMBNAIL_SIZES[size]
+    if crop:
+        image = ImageOps.fit(source, (width, height), Image.LANCZOS)
+    else:
+        image = source.copy()
+        # keeps aspect ratio, never enlarges
+        image.thumbnail((width, height), Image.LANCZOS)
+
+    if image_format == "JPEG" and image.mode != "RGB":
+        # no transparency in JPEG => white background
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        image = image.convert("RGBA")
+        background.paste(image, mask=image.split()[3])
+        image = background
+
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=THUMBNAIL_QUALITY)
+    return buffer.getvalue()
+
+
+def generate_thumbnails(image_file):
+    """
+    Creates thumbnails of all THUMBNAIL_SIZES for given image. Names of the thumbnails are derived from content
+    of the image, so same image uploaded several times is processed only once and changed image never gets
+    stale thumbnail from browser caches.
+
+    :param image_file:  image (e.g. `FieldFile` of `ImageField`, even not yet saved one)
+    :return:            hash of the image to be used with get_thumbnail_name(), empty string in case of failure
+                        (e.g. unsupported image format)
+    """
+    image_file.open("rb")
+    try:
+        content = image_file.read()
+    finally:
+        # not yet saved uploads are going to be read again by storage
+        image_file.seek(0)
+    image_hash = hashlib.sha256(content).hexdigest()[:32]
+
+    try:
+        source = None
+        for size in THUMBNAIL_SIZES:
+            name = get_thumbnail_name(image_hash, size)
+            if default_storage.exists(name):
+                continue
+            if source is None:
+                source = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+            default_storage.save(name, ContentFile(_render_thumbnail(source, size)))
+    except (OSError, ValueError, Image.DecompressionBombError) as ex:
+        print("WARNING failed to generate thumbnails for %s: %s" % (image_file, ex))
+        return ""
+
+    return image_hash
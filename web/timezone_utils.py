@@ -1,6 +1,11 @@
 import pytz
 
+from functools import lru_cache
+
 from django.conf import settings
+from django.utils.html import format_html_join
+from django.utils.safestring import mark_safe
+from django.utils.translation.trans_real import parse_accept_lang_header
 import django.utils.timezone as djtz
 
 
@@ -9,28 +14,74 @@ SESSION_TIMEZONE = "django_timezone"
 TIMEZONE_CHOICES = sorted(pytz.common_timezones)
 
 
+@lru_cache(maxsize=len(TIMEZONE_CHOICES))
+def get_tz(tzname):
+    """:return: timezone object (pytz) for given name, looked up once per process"""
+    return pytz.timezone(tzname)
+
+
+@lru_cache(maxsize=256)
+def get_timezone_from_accept_language(header):
+    """
+    Guesses timezone from country in preferred languages of the browser, e.g. "sk-SK,sk;q=0.9,en;q=0.8"
+    gives "Europe/Bratislava". For countries with several timezones, the main one (first in pytz) is used.
+
+    :param header:  value of Accept-Language HTTP header
+    :return:        name of the timezone, None if there is no country in the header
+    """
+    for (language, _) in parse_accept_lang_header(header):
+        # e.g. "en-us", "zh-hant-tw" but not "es-419"
+        country = language.split("-")[-1].upper()
+        if "-" in language and country in pytz.country_timezones:
+            return pytz.country_timezones[country][0]
+    return None
+
+
 class TimezoneMiddleware:
     def __init__(self, get_response):
         self.get_response = get_response
 
     def __call__(self, request):
         tzname = request.session.get(SESSION_TIMEZONE)
+        if not tzname:
+            # not stored into session: it is just a default, until user chooses the timezone
+            tzname = get_timezone_from_accept_language(
+                request.headers.get("Accept-Language", "")
+            )
+            request.inferred_timezone = tzname
         if tzname:
-            djtz.activate(pytz.timezone(tzname))
+            djtz.activate(get_tz(tzname))
         else:
-            # TODO: try guessing timezone from IP, language, whatever
             djtz.deactivate()
         return self.get_response(request)
 
 
 def inject_timezones(request):
+    # note: list of timezones is not here, see get_timezone_options_html()
     return {
         "timezone_known": SESSION_TIMEZONE in request.session,
-        "timezones": TIMEZONE_CHOICES,
     }
 
 
+@lru_cache(maxsize=64)
+def get_timezone_options_html(selected):
+    """
+    Returns <option> elements for timezone SELECT, rendered once per selected timezone (there are ~440 of
+    them, so rendering them via template on every request is not cheap).
+
+    :param selected:    name of the timezone to be selected
+    """
+    return format_html_join(
+        "\n",
+        '<option value="{}"{}>{}</option>',
+        (
+            (tz, mark_safe(" selected") if tz == selected else "", tz)
+            for tz in TIMEZONE_CHOICES
+        ),
+    )
+
+
 def get_timezone(request):
     if SESSION_TIMEZONE in request.session:
         return request.session[SESSION_TIMEZONE]
-    return settings.TIME_ZONE
+    return getattr(request, "inferred_timezone", None) or settings.TIME_ZONE
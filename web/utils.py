@@ -5,8 +5,8 @@ from datetime import date
 import django.utils.timezone as djtz
 
 from django.conf import settings
+from django.db.models import Case, F, Q, Value, When
 
-from constance import config
 from rest_framework_jwt.utils import jwt_payload_handler
 from rest_framework_json_api.exceptions import exception_handler
 from sentry_sdk import capture_message, set_context
@@ -15,14 +15,16 @@ from sentry_sdk import capture_message, set_context
 if not settings.FE_DEPLOYMENT:
     from django_q.tasks import async_task
 
-from .data import GC
+from .cache_utils import bump_resource_generation, get_shared_cache
+from .config_utils import get_config_snapshot
+from .geo_utils import get_geo_index
 from .models import Resource
 from .serializers import SubmissionResourceSerializer
 
 
 def inject_template_variables(request):
     return {
-        "hide_resource_buttons": config.HIDE_RESOURCE_BUTTONS_IN_BASE_TEMPLACE,
+        "hide_resource_buttons": get_config_snapshot().hide_resource_buttons,
         "contributions_open": contribution_period_is_now(),
         "signup_enabled": settings.SIGNUP_ENABLED,
     }
@@ -73,10 +75,9 @@ def days_to_go():
 
 
 def contribution_period_is_now():
-    now = arrow.utcnow()
-    start = arrow.get(config.OEW_CFP_OPEN).datetime
-    end = arrow.get(settings.OEW_RANGE[1])
-    return now >= start and now <= end
+    snapshot = get_config_snapshot()
+    now = djtz.now()
+    return now >= snapshot.cfp_start and now <= snapshot.cfp_end
 
 
 def __noneOrEmpty(str):
@@ -91,69 +92,264 @@ def _abort_needed(resource):
     return __noneOrEmpty(resource.city) and __noneOrEmpty(resource.country)
 
 
-def _set_location(resource, city):
-    if _abort_needed(resource):
-        print("guessing aborted (late): %d" % resource.id)
-        return
-
-    resource.lat = city["latitude"]
-    resource.lng = city["longitude"]
-    resource.save()
-    print("guessing for %d: lat/lon: %s/%s" % (resource.id, resource.lat, resource.lng))
-
-
 def get_gc_city_entry(country, city):
-    # try fast(-er) matching ...
+    index = get_geo_index()
     cities = []
     if not __noneOrEmpty(city):
-        cities = GC.search_cities(city)
-        if len(cities) == 0:
-            # ... and if fails, try slower matching
-            cities = GC.search_cities(city, case_sensitive=False)
+        cities = index.search_cities(city)
 
     # easy case: we find just one city
     if len(cities) == 1:
         return cities[0]
 
     # complicated case: we find more cities or no city given => we try to figure it out via country
-    if country is not None:
-        countries = GC.get_countries_by_names()
-        if country in countries:
-            country = countries[country]
-            if len(cities) > 0:
-                for city in cities:
-                    if city["countrycode"] == country["iso"]:
-                        return city
-            else:
-                cities = GC.get_cities_by_name(country["capital"])
-                if len(cities) == 1:
-                    city_dict = cities[0]
-                    city_key = next(iter(city_dict))
-                    return city_dict[city_key]
+    if country is not None and country in index.countries:
+        country = index.countries[country]
+        if len(cities) > 0:
+            for city in cities:
+                if city["countrycode"] == country["iso"]:
+                    return city
+        else:
+            return index.get_capital(country["iso"])
 
     return None
 
 
+# fields read by location guessing (see _guess_locations())
+LOCATION_FIELDS = [
+    "lat",
+    "lng",
+    "event_source_timezone",
+    "location_pending",
+    "modified",
+]
+
+# how much resources to process at once
+LOCATION_BATCH_SIZE = 500
+
+# how much resources to write by one query (see _write_guessed()): each one needs up to 12 query parameters
+# (`pk` and `modified` in the condition, `pk` and value in each of 5 `Case` expressions when guessing locations),
+# SQLite before 3.32 allows 999 of them
+LOCATION_WRITE_BATCH_SIZE = 80
+
+# pending resources are processed by scheduled task (see apps.py) or right away if there are more of them
+LOCATION_BACKLOG_THRESHOLD = 50
+
+# set while pass over pending resources is queued (see guess_missing_activity_fields_async()), expires
+# in case the pass fails; in shared cache, as it is set by web process and cleared by django-q cluster
+LOCATION_PASS_QUEUED_KEY = "web:location-pass-queued"
+LOCATION_PASS_QUEUED_TIMEOUT = 15 * 60
+
+
+def _get_field_case(field_name, values):
+    """
+    :param values:  {<resource ID>: <value>}
+    :return:        expression giving value of the field for given resources, current value for others
+    """
+    return Case(
+        *[When(pk=id, then=Value(value)) for (id, value) in values.items()],
+        default=F(field_name),
+        output_field=Resource._meta.get_field(field_name),
+    )
+
+
+def _write_guessed(read_modified, guessed, now, **values):
+    """
+    Writes guessed values of fields, but only into resources which did not change since they were read: resource
+    saved meanwhile (e.g. with another city or timezone entered by submitter) keeps what was saved (and stays
+    pending, if it is, to be guessed again later).
+
+    :param read_modified:   {<resource ID>: <`modified` when read>}, for all the processed resources
+    :param guessed:         {<resource ID>: {<field name>: <guessed value>, ...}}, `modified` of these resources
+                            is set to `now`
+    :param now:             new `modified` of resources with guessed values
+    :param values:          values of fields set for all the processed resources (e.g. `location_pending`)
+    """
+    ids = list(read_modified.keys())
+    for i in range(0, len(ids), LOCATION_WRITE_BATCH_SIZE):
+        chunk = ids[i : i + LOCATION_WRITE_BATCH_SIZE]
+        unchanged = Q()
+        for id in chunk:
+            unchanged |= Q(pk=id, modified=read_modified[id])
+
+        chunk_guessed = {id: guessed[id] for id in chunk if id in guessed}
+        fields = {}
+        for (id, guessed_values) in chunk_guessed.items():
+            for (field_name, value) in guessed_values.items():
+                fields.setdefault(field_name, {})[id] = value
+        updates = {
+            field_name: _get_field_case(field_name, field_values)
+            for (field_name, field_values) in fields.items()
+        }
+        if len(chunk_guessed) > 0:
+            updates["modified"] = _get_field_case(
+                "modified", {id: now for id in chunk_guessed.keys()}
+            )
+        updates.update(values)
+        if len(updates) > 0:
+            Resource.objects.filter(unchanged).update(**updates)
+
+
+def _guess_locations(resources, batch_size=LOCATION_BATCH_SIZE):
+    """
+    Fills in lat/lon (and source timezone of events, if missing) of given resources based on their city and
+    country, in bulk. Only these fields are written (plus `modified`, to refresh cached cards), resources are not saved
+    as whole. Resources are no longer pending afterwards, unless they were saved meanwhile.
+
+    :param resources:   queryset of resources
+    :param batch_size:  how much resources to load and update at once
+    :return:            number of resources with guessed location
+    """
+    # IDs first, as the resources are going to change (e.g. `location_pending`) while being processed
+    ids = list(resources.order_by("id").values_list("id", flat=True))
+    # lots of resources from the same city
+    city_entries = {}
+    count = 0
+    for i in range(0, len(ids), batch_size):
+        now = djtz.now()
+        read_modified = {}
+        guessed = {}
+        for resource in Resource.objects.filter(id__in=ids[i : i + batch_size]).only(
+            "id", *LOCATION_FIELDS, "post_type", "city", "country"
+        ):
+            # not guessed ones are no longer pending either
+            read_modified[resource.id] = resource.modified
+            if _abort_needed(resource):
+                continue
+            key = (resource.country, resource.city)
+            if key not in city_entries:
+                city_entries[key] = get_gc_city_entry(*key)
+            if city_entries[key] is None:
+                print("failed to guess lat/lon for %s" % resource.city)
+                continue
+
+            values = {
+                "lat": city_entries[key]["latitude"],
+                "lng": city_entries[key]["longitude"],
+            }
+            if resource.post_type == "event" and not resource.event_source_timezone:
+                values["event_source_timezone"] = city_entries[key]["timezone"]
+                values["event_source_timezone_guessed"] = True
+            guessed[resource.id] = values
+
+        _write_guessed(read_modified, guessed, now, location_pending=False)
+        count += len(guessed)
+
+    if count > 0:
+        # update() does not send signals
+        bump_resource_generation()
+    return count
+
+
+def get_timezone_for_location(country, city):
+    """:return: timezone of the city, if not known, then of capital of the country, None if none of them is known"""
+    city_entry = get_gc_city_entry(country, city)
+    if city_entry is None and country:
+        index = get_geo_index()
+        if country in index.countries:
+            city_entry = index.get_capital(index.countries[country]["iso"])
+    return city_entry["timezone"] if city_entry is not None else None
+
+
+def guess_timezones(resources, batch_size=LOCATION_BATCH_SIZE):
+    """
+    Fills in source timezone of given events which do not have it (based on city and country), in bulk.
+    Guessed timezones are marked as such (see `Resource.event_source_timezone_guessed`), other resources
+    are skipped.
+
+    :return:    number of updated resources
+    """
+    ids = list(
+        resources.filter(post_type="event")
+        .filter(Q(event_source_timezone="") | Q(event_source_timezone__isnull=True))
+        .order_by("id")
+        .values_list("id", flat=True)
+    )
+    timezones = {}
+    count = 0
+    for i in range(0, len(ids), batch_size):
+        now = djtz.now()
+        read_modified = {}
+        guessed = {}
+        for resource in Resource.objects.filter(id__in=ids[i : i + batch_size]).only(
+            "id", "event_source_timezone", "modified", "city", "country"
+        ):
+            if _abort_needed(resource):
+                continue
+            key = (resource.country, resource.city)
+            if key not in timezones:
+                timezones[key] = get_timezone_for_location(*key)
+            if timezones[key] is None:
+                continue
+            read_modified[resource.id] = resource.modified
+            guessed[resource.id] = {
+                "event_source_timezone": timezones[key],
+                "event_source_timezone_guessed": True,
+            }
+        _write_guessed(read_modified, guessed, now)
+        count += len(guessed)
+
+    if count > 0:
+        bump_resource_generation()
+    return count
+
+
 def guess_missing_location(resource_id):
-    resource = Resource.objects.get(pk=resource_id)
-    if _abort_needed(resource):
-        print("guessing aborted (early): %d" % resource_id)
-        return
+    _guess_locations(Resource.objects.filter(pk=resource_id))
 
-    gc_city_entry = get_gc_city_entry(resource.country, resource.city)
-    if gc_city_entry is None:
-        print("failed to guess lat/lon for %s" % resource.city)
-        return
 
-    _set_location(resource, gc_city_entry)
+def guess_locations(resources, batch_size=LOCATION_BATCH_SIZE):
+    """
+    Fills in lat/lon of given resources which do not have them yet (e.g. after import).
+
+    :return:    number of updated resources
+    """
+    return _guess_locations(
+        resources.filter(lat__isnull=True, lng__isnull=True), batch_size
+    )
+
+
+def _location_pass_started():
+    # resources marked from now on need another pass
+    get_shared_cache().delete(LOCATION_PASS_QUEUED_KEY)
+
+
+def guess_pending_locations():
+    """Processes all resources waiting for location guessing (see guess_missing_activity_fields_async())."""
+    _location_pass_started()
+
+    ids = list(
+        Resource.objects.filter(location_pending=True).values_list("id", flat=True)
+    )
+    count = _guess_locations(Resource.objects.filter(id__in=ids))
+    if count > 0:
+        print("lat/lon guessed for %d resources" % count)
+    # city not found => at least timezone (of the country)
+    guess_timezones(Resource.objects.filter(id__in=ids))
+    return count
 
 
 def guess_missing_activity_fields_async(resource):
+    """Marks resource for location guessing, which is done in batches (see guess_pending_locations())."""
+    if _abort_needed(resource):
+        return
+    Resource.objects.filter(pk=resource.pk).update(location_pending=True)
+
     if settings.FE_DEPLOYMENT:
         print(
-            "WARNING, back-end stuff disabled => guessing of missing activity fields skipped"
+            "WARNING, back-end stuff disabled => guessing of missing activity fields postponed"
         )
         return
-    if _abort_needed(resource):
+    if get_shared_cache().get(LOCATION_PASS_QUEUED_KEY):
+        # pass is already queued, it is going to process this resource too
         return
-    async_task(guess_missing_location, resource.id)
+    if (
+        Resource.objects.filter(location_pending=True).count()
+        >= LOCATION_BACKLOG_THRESHOLD
+    ):
+        # `add()` so that concurrent saves (mostly) do not queue more passes, overlapping passes would be
+        # harmless anyway (see _write_guessed())
+        if get_shared_cache().add(
+            LOCATION_PASS_QUEUED_KEY, True, LOCATION_PASS_QUEUED_TIMEOUT
+        ):
+            async_task(guess_pending_locations)
@@ -1,13 +1,10 @@
 import arrow
 import bleach
-import pytz
-import urllib.parse
 import twitter
 import uuid
-import xlwt
 
 from itertools import groupby
-from datetime import datetime, timezone
+from datetime import timezone
 from enum import Enum
 
 import django.utils.timezone as djtz
@@ -16,12 +13,17 @@ from django.conf import settings
 from django.contrib.auth.decorators import user_passes_test
 from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.core.paginator import Paginator
-from django.core.paginator import EmptyPage, PageNotAnInteger
 from django.db import models
 from django.db.models import Q
 from django.db.models.functions import Lower
-from django.http import Http404, HttpRequest, HttpResponse, HttpResponseRedirect
+from django.http import (
+    Http404,
+    HttpRequest,
+    HttpResponse,
+    HttpResponseBadRequest,
+    HttpResponseRedirect,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, redirect, render
 from django.urls import reverse
 from django.views.decorators.http import require_POST
@@ -36,10 +38,14 @@ from cryptography.fernet import InvalidToken
 from django_htmx.middleware import HtmxDetails
 
 from rest_framework import permissions, viewsets, generics, mixins
+from rest_framework.exceptions import NotFound
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from .export_utils import EXPORT_FORMATS, get_export_queryset, iter_export_rows
+from .facet_utils import get_library_facets
 from .favorites_utils import (
     create_favorites,
     decode_favorites,
@@ -56,6 +62,8 @@ from .models import (
     EmailTemplate,
     send_email_async,
 )
+from .page_cache_utils import cache_anonymous_page
+from .pagination_utils import get_cached_count, paginate_keyset
 from .serializers import (
     PageSerializer,
     ResourceSerializer,
@@ -64,8 +72,10 @@ from .serializers import (
     EmailTemplateSerializer,
     ResourceImageSerializer,
 )
+from .schedule_utils import get_oe_week_calendar, get_schedule_index
+from .snapshot_utils import EventRow, get_event_snapshot
 from .screenshot_utils import fetch_screenshot_async
-from .timezone_utils import SESSION_TIMEZONE, TIMEZONE_CHOICES, get_timezone
+from .timezone_utils import SESSION_TIMEZONE, TIMEZONE_CHOICES, get_timezone, get_tz
 from .utils import (
     contribution_period_is_now,
     days_to_go,
@@ -123,7 +133,7 @@ def _set_session_tz_from_form_value(request):
     tzname = request.POST.get("event_source_timezone")
     if tzname:
         request.session[SESSION_TIMEZONE] = tzname
-        djtz.activate(pytz.timezone(tzname))
+        djtz.activate(get_tz(tzname))
 
 
 def _get_library_description_box_status(request, type):
@@ -133,7 +143,17 @@ def _get_library_description_box_status(request, type):
 
 
 def _set_library_description_box_status(request, type, value):
-    request.session[type] = value
+    # only on actual change, so that session is not saved (and page can be cached) on every visit
+    if request.session.get(type) != value:
+        request.session[type] = value
+
+
+def _get_filter_params(request):
+    """library filter parameters (e.g. without paging)"""
+    params = request.GET.copy()
+    params.pop("cursor", None)
+    params.pop("page", None)
+    return params
 
 
 def contribute_activity(request, identifier=None):
@@ -311,45 +331,11 @@ def thanks(request):
     return render(request, "web/thanks.html")
 
 
-def _init_oe_week_days():
-    oe_week_days = []
-
-    start_day = arrow.get(settings.OEW_RANGE[0])
-    end_day = arrow.get(settings.OEW_RANGE[1])
-    day = start_day
-    while day < end_day:
-        # TODO: use proper class instead of tuple, so that we can use say `name` instead of `1` in the code and templates
-        oe_week_days.append(
-            (day.format("dddd"), day.format("dddd, MMMM D"), day.format("d"))
-        )
-        day = day.shift(days=1)
-    oe_week_days.append(("Other", "Other days", "other"))
-
-    return oe_week_days
-
-
-EO_WEEK_DAYS = _init_oe_week_days()
-
-
 class ResourceOrdering(Enum):
     DEFAULT = 1
     LIBRARY = 2
 
 
-def _set_event_day_number(event, tz):
-    result = "other"
-    if not event.event_time:
-        return result
-
-    oew_start = arrow.get(settings.OEW_RANGE[0], tzinfo=tz).datetime
-    oew_end = arrow.get(settings.OEW_RANGE[1], tzinfo=tz).datetime
-    if event.event_time >= oew_start and event.event_time <= oew_end:
-        result = event.event_time.astimezone(tz).strftime("%w")
-
-    event.event_day_number = result
-    return event
-
-
 def _get_events_query_set(
     year=None,
     id_filter=None,
@@ -364,19 +350,17 @@ def _get_events_query_set(
         result = result.filter(year=year)
     if id_filter is not None:
         result = result.filter(id__in=id_filter)
-    result = (
-        result
-        # TODO: very few items like that => try to sort that out without such excludes
-        .exclude(event_source_timezone__exact="")
-        .exclude(event_source_timezone__isnull=True)
-        .exclude(event_time__isnull=True)
-    )
+    # source timezone is not needed (event_time is in UTC) and gets guessed anyway (see utils.guess_timezones())
+    result = result.filter(event_time__isnull=False)
     if from_time:
         result = result.filter(event_time__gte=from_time)
 
     # order
     if ordering == ResourceOrdering.LIBRARY:
-        result = result.order_by("-year", Lower("title"))
+        # by names, with unique `id` at the end => usable for keyset pagination
+        result = result.annotate(lower_title=Lower("title")).order_by(
+            "-year", "lower_title", "id"
+        )
     else:
         result = result.order_by("event_time", Lower("title"))
 
@@ -400,34 +384,48 @@ def _get_events_list(
     :param year:        year for which to get a list (default: all years)
     :return:            (days_with_events, event_count)
     """
-    event_list = _get_events_query_set(year=settings.OEW_YEAR, id_filter=id_filter)
-    event_count = event_list.count()
+    # day numbers depend on timezone of the user => use index of events per day precomputed for that timezone
+    tz = get_tz(get_timezone(request))
+    schedule_index = get_schedule_index(
+        settings.OEW_YEAR, tz, _get_events_query_set(year=settings.OEW_YEAR)
+    )
+    oe_week_days = get_oe_week_calendar(tz).days
+    if id_filter is not None:
+        id_filter = set(id_filter)
 
-    # fill in event day numbers based on timezone of the user, optionally also add `favorite` flag
-    tz = pytz.timezone(get_timezone(request))
-    for event in event_list:
-        _set_event_day_number(event, tz)
-        if favorites is not None:
-            event.favorite = event.id in favorites
+    snapshot = get_event_snapshot(
+        settings.OEW_YEAR, _get_events_query_set(year=settings.OEW_YEAR)
+    )
 
-    # make a list of events per day
-    event_list_per_day = {}
-    for (_, _, number) in EO_WEEK_DAYS:
+    # make a list of event IDs per day
+    event_ids_per_day = {}
+    event_count = 0
+    for (_, _, number) in oe_week_days:
+        # index and snapshot may be built from different generations (resource saved meanwhile) => only events
+        # we have rows for, so that the count matches the list
+        event_ids = [id for id in schedule_index[number] if id in snapshot]
+        if id_filter is not None:
+            event_ids = [id for id in event_ids if id in id_filter]
+        event_count += len(event_ids)
         if event_day_number_filter and event_day_number_filter != number:
             continue
+        event_ids_per_day[number] = event_ids
+
+    # make lightweight rows only for events we're going to show, optionally also add `favorite` flag
+    event_list_per_day = {}
+    for (number, event_ids) in event_ids_per_day.items():
         event_list_per_day[number] = []
-    for event in event_list:
-        if (
-            event_day_number_filter
-            and event_day_number_filter != event.event_day_number
-        ):
-            continue
-        event_list_per_day[event.event_day_number].append(event)
+        for id in event_ids:
+            favorite = None
+            if favorites is not None:
+                favorite = id in favorites
+            event_list_per_day[number].append(
+                EventRow(snapshot[id], event_day_number=number, favorite=favorite)
+            )
 
-    # merge event_list_per_day with EO_WEEK_DAYS, skip days with no events
-    # (note: Yes, not very nice and efficient, but since day numbers depend in timezone from request ...)
+    # merge event_list_per_day with days of OE Week, skip days with no events
     days_with_events = []
-    for (name, name_date, number) in EO_WEEK_DAYS:
+    for (name, name_date, number) in oe_week_days:
         if event_day_number_filter and event_day_number_filter != number:
             continue
         if event_day_number_filter is not None:
@@ -440,14 +438,26 @@ def _get_events_list(
     return (days_with_events, event_count)
 
 
+def _get_coming_up_next_list(current_time_utc):
+    snapshot = get_event_snapshot(
+        settings.OEW_YEAR, _get_events_query_set(year=settings.OEW_YEAR)
+    )
+    # snapshot is ordered by `event_time` => first N events from given time on
+    coming_up_next_list = []
+    for values in snapshot.values():
+        if len(coming_up_next_list) >= settings.COMING_UP_NEXT_COUNT:
+            break
+        event = EventRow(values)
+        if event.event_time >= current_time_utc:
+            coming_up_next_list.append(event)
+    return coming_up_next_list
+
+
+@cache_anonymous_page
 def show_events(request):
     (days_with_events, event_count) = _get_events_list(request, year=settings.OEW_YEAR)
     current_time_utc = djtz.now()
-    coming_up_next_list = _get_events_query_set(
-        year=settings.OEW_YEAR,
-        from_time=current_time_utc,
-        count_limit=settings.COMING_UP_NEXT_COUNT,
-    )
+    coming_up_next_list = _get_coming_up_next_list(current_time_utc)
     context = {
         "title": "OE Week %s Events" % settings.OEW_YEAR,
         "days_with_events": days_with_events,
@@ -460,29 +470,25 @@ def show_events(request):
     return render(request, "web/events.html", context=context)
 
 
+@cache_anonymous_page
 def show_events_library(request):
     """library: list of resources for all year"""
+    event_list = _get_events_query_set(ordering=ResourceOrdering.LIBRARY)
     f = EventFilter(
-        request.GET, queryset=_get_events_query_set(ordering=ResourceOrdering.LIBRARY)
+        request.GET,
+        queryset=event_list,
+        facets=get_library_facets("events", event_list),
     )
-    event_list = f.qs
-    events_count_total = event_list.count()
-
-    paginator = Paginator(event_list, LIBRARY_RESULTS_PER_PAGE)
-    page = request.GET.get("page", 0)
-    if page == 0:
-        query_params = request.GET.copy()
-        query_params["page"] = 1
-        return HttpResponseRedirect(
-            reverse("library_events") + "?" + query_params.urlencode()
-        )
     try:
-        event_list = paginator.page(page)
-    except (EmptyPage, PageNotAnInteger):
+        event_list = paginate_keyset(
+            f.qs, request.GET.get("cursor"), LIBRARY_RESULTS_PER_PAGE
+        )
+    except ValueError:
         raise Http404("Page not found.")
+    events_count_total = get_cached_count("events", _get_filter_params(request), f.qs)
 
     current_time_utc = djtz.now()
-    events_count = event_list.object_list.count()
+    events_count = len(event_list)
     context = {
         "title": "All Events",
         "current_time_utc": current_time_utc,
@@ -490,7 +496,6 @@ def show_events_library(request):
         "event_count": events_count,
         "days_to_go": days_to_go,
         "filter": f,
-        "paginator": paginator,
         "reload_after_timezone_change": True,
     }
     if events_count != events_count_total:
@@ -514,6 +519,7 @@ def handle_old_event_detail(request, slug):
     return redirect("show_event_detail", year=resource.year, slug=resource.slug)
 
 
+@cache_anonymous_page
 def show_event_detail(request, year, slug):
     event = get_object_or_404(Resource, year=year, slug=slug, post_type="event")
     if event.post_status != "publish" and not request.user.is_staff:
@@ -534,13 +540,17 @@ def _resources_query_set(year=None, ordering=ResourceOrdering.DEFAULT):
 
     # order
     if ordering == ResourceOrdering.LIBRARY:
-        result = result.order_by("-year", Lower("title"))
+        # see _get_events_query_set()
+        result = result.annotate(lower_title=Lower("title")).order_by(
+            "-year", "lower_title", "id"
+        )
     else:
         result = result.order_by(Lower("title"))
 
     return result
 
 
+@cache_anonymous_page
 def show_resources(request):
     """list of resources (assets) for current year"""
     resource_list = _resources_query_set(year=settings.OEW_YEAR)
@@ -556,36 +566,32 @@ def show_resources(request):
     return render(request, "web/resources.html", context)
 
 
+@cache_anonymous_page
 def show_resources_library(request):
     """library: list of resources for all year"""
+    resource_list = _resources_query_set(ordering=ResourceOrdering.LIBRARY)
     f = AssetFilter(
-        request.GET, queryset=_resources_query_set(ordering=ResourceOrdering.LIBRARY)
+        request.GET,
+        queryset=resource_list,
+        facets=get_library_facets("resources", resource_list),
     )
-    resource_list = f.qs
-    resource_count_total = resource_list.count()
-
-    paginator = Paginator(resource_list, LIBRARY_RESULTS_PER_PAGE)
-    page = request.GET.get("page", 0)
-    if page == 0:
-        query_params = request.GET.copy()
-        query_params["page"] = 1
-        return HttpResponseRedirect(
-            reverse("library_resources") + "?" + query_params.urlencode()
-        )
     try:
-        resource_list = paginator.page(page)
-    except (EmptyPage, PageNotAnInteger):
+        resource_list = paginate_keyset(
+            f.qs, request.GET.get("cursor"), LIBRARY_RESULTS_PER_PAGE
+        )
+    except ValueError:
         raise Http404("Page not found.")
+    resource_count_total = get_cached_count(
+        "resources", _get_filter_params(request), f.qs
+    )
 
-    resource_count = f.qs.count()
-    resource_count = resource_list.object_list.count()
+    resource_count = len(resource_list)
     context = {
         "title": "OE Week Library",
         "resource_list": resource_list,
         "resource_count": resource_count,
         "days_to_go": days_to_go,
         "filter": f,
-        "paginator": paginator,
     }
     if resource_count != resource_count_total:
         context["resource_count_total"] = resource_count_total
@@ -608,6 +614,7 @@ def handle_old_resource_detail(request, slug):
     return redirect("show_resource_detail", year=resource.year, slug=resource.slug)
 
 
+@cache_anonymous_page
 def show_resource_detail(request, year, slug):
     resource = get_object_or_404(Resource, year=year, slug=slug, post_type="resource")
     if resource.post_status != "publish" and not request.user.is_staff:
@@ -637,6 +644,7 @@ SCHEDULE_DAYS = {
 }
 
 
+@cache_anonymous_page
 def schedule_list(request, day):
     """schedule: list of events for given day in current year (=settings.OEW_YEAR)"""
     if day not in SCHEDULE_DAYS:
@@ -655,11 +663,7 @@ def schedule_list(request, day):
     )
 
     current_time_utc = djtz.now()
-    coming_up_next_list = _get_events_query_set(
-        year=settings.OEW_YEAR,
-        from_time=current_time_utc,
-        count_limit=settings.COMING_UP_NEXT_COUNT,
-    )
+    coming_up_next_list = _get_coming_up_next_list(current_time_utc)
     context = {
         "title": "Schedule %s" % settings.OEW_YEAR,
         "days_with_events": days_with_events,
@@ -844,7 +848,7 @@ def submit_resource_feedback(request):
 class LargeResultsSetPagination(PageNumberPagination):
     page_size = 1000
     page_size_query_param = "page_size"
-    max_page_size = 10000
+    max_page_size = 1000
     page_query_param = "page[number]"
 
 
@@ -861,6 +865,55 @@ class LargeMaxPageSizePagination(PageNumberPagination):
     page_query_param = "page[number]"
 
 
+class KeysetOrLargeMaxPageSizePagination(LargeMaxPageSizePagination):
+    """Same as LargeMaxPageSizePagination, unless `page[cursor]` is used (with empty value for the first
+    page), then keyset pagination (see pagination_utils.paginate_keyset()) is used. That requires query set
+    ordered by field names ending with `id`."""
+
+    cursor_query_param = "page[cursor]"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset_page = None
+        if (
+            self.cursor_query_param not in request.query_params
+            or queryset.query.is_sliced
+        ):
+            return super().paginate_queryset(queryset, request, view)
+
+        self.request = request
+        try:
+            self.keyset_page = paginate_keyset(
+                queryset,
+                request.query_params[self.cursor_query_param],
+                self.get_page_size(request),
+            )
+        except ValueError:
+            raise NotFound("Invalid cursor.")
+        return self.keyset_page.object_list
+
+    def get_paginated_response(self, data):
+        if self.keyset_page is None:
+            return super().get_paginated_response(data)
+
+        # JSON:API style links (see rest_framework_json_api.pagination)
+        return Response(
+            {
+                "results": data,
+                "links": {
+                    "next": self._get_cursor_link(self.keyset_page.next_cursor),
+                    "prev": self._get_cursor_link(self.keyset_page.previous_cursor),
+                },
+            }
+        )
+
+    def _get_cursor_link(self, cursor):
+        if cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+
 class PageViewSet(viewsets.ModelViewSet):
     serializer_class = PageSerializer
 
@@ -917,7 +970,9 @@ class ResourceEventMixin(generics.GenericAPIView):
 
         if self.request.GET.get("opentags"):
             opentags = self.request.GET.get("opentags", "").split(",")
-            queryset = queryset.filter(opentags__contains=opentags)
+            # resources having all of given tags
+            for opentag in opentags:
+                queryset = queryset.filter(tags__name=opentag)
 
         return queryset
 
@@ -935,7 +990,7 @@ class ResourceViewSet(ResourceEventMixin, viewsets.ModelViewSet):
 
 class EventViewSet(ResourceEventMixin, viewsets.ModelViewSet):
     serializer_class = ResourceSerializer
-    pagination_class = LargeMaxPageSizePagination
+    pagination_class = KeysetOrLargeMaxPageSizePagination
     resource_name = "event"
 
     def get_queryset(self):
@@ -981,7 +1036,7 @@ class EventViewSet(ResourceEventMixin, viewsets.ModelViewSet):
                     event_time__day=date.day,
                 )
 
-        return queryset.order_by("event_time")
+        return queryset.order_by("event_time", "id")
 
 
 class EventSummaryView(APIView):
@@ -1010,80 +1065,35 @@ class EventSummaryView(APIView):
 
 
 class ExportResources(LoginRequiredMixin, View):
+    """
+    Exports resources as CSV, JSON Lines or XLSX (`format` parameter, default XLSX), streamed in chunks, so that
+    even export of all the years does not need much memory.
+
+    Filters: `year` (can be repeated, "all" for all the years, default: current one) and `status` (can be
+    repeated, "all" for all the statuses, default: published).
+    """
+
     def get(self, request):
-        response = HttpResponse(content_type="application/ms-excel")
-        response["Content-Disposition"] = "attachment; filename=oerweek-resources.xls"
-
-        font_style = xlwt.XFStyle()
-        font_style.font.bold = True
-
-        datetime_style = xlwt.easyxf(num_format_str="dd/mm/yyyy hh:mm")
-
-        wb = xlwt.Workbook(encoding="utf-8")
-        ws = wb.add_sheet("Resources")
-
-        row_num = 0
-
-        columns = [
-            ("ID", 2000),
-            ("Resource Type", 6000),
-            ("Title", 6000),
-            ("Organization", 8000),
-            ("Contact name", 8000),
-            ("Email", 8000),
-            ("OEW URL", 8000),
-            ("Resources URL", 8000),
-            ("Event Type", 8000),
-            ("Date and Time", 8000),
-            ("Country", 8000),
-            ("City", 8000),
-            ("Language", 8000),
-            ("Twitter", 8000),
-            ("Tags", 8000),
-        ]
-
-        for col_num in range(len(columns)):
-            ws.write(row_num, col_num, columns[col_num][0], font_style)
-            ws.col(col_num).width = columns[col_num][1]
-
-        font_style = xlwt.XFStyle()
-        font_style.alignment.wrap = 1
-
-        for resource in Resource.objects.filter(
-            post_status="publish", year=settings.OEW_YEAR
-        ):
-            row_num += 1
-
-            event_time = ""
-            if resource.event_time:
-                # event_time = resource.event_time.strftime('%Y-%m-%d %H:%M')
-                event_time = resource.event_time.replace(tzinfo=None)
-
-            row = [
-                resource.post_id,
-                resource.post_type,
-                urllib.parse.unquote(resource.title),
-                resource.institution,
-                resource.contact,
-                resource.email,
-                resource.get_full_url(),
-                resource.link,
-                resource.event_type,
-                event_time,
-                resource.country,
-                resource.city,
-                resource.form_language,
-                resource.twitter,
-                ", ".join(resource.opentags or []),
-            ]
-
-            for col_num in range(len(row)):
-                if isinstance(row[col_num], datetime):
-                    ws.write(row_num, col_num, row[col_num], datetime_style)
-                else:
-                    ws.write(row_num, col_num, row[col_num], font_style)
-
-        wb.save(response)
+        export_format = request.GET.get("format", "xlsx")
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest("unknown format: %s" % export_format)
+        (stream, content_type, extension) = EXPORT_FORMATS[export_format]
+
+        years = request.GET.getlist("year") or [settings.OEW_YEAR]
+        statuses = request.GET.getlist("status") or [Resource.POST_STATUS_PUBLISH]
+        try:
+            years = None if "all" in years else [int(year) for year in years]
+        except ValueError:
+            return HttpResponseBadRequest("invalid year")
+        statuses = None if "all" in statuses else statuses
+
+        response = StreamingHttpResponse(
+            stream(iter_export_rows(get_export_queryset(years, statuses))),
+            content_type=content_type,
+        )
+        response["Content-Disposition"] = (
+            "attachment; filename=oerweek-resources.%s" % extension
+        )
         return response
 
 